@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Benchmark of infoscraper's filename parsing and BBCode formatting over synthetic releases
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import infoscraper
+
+NAME_PATTERNS = [
+    "{title}.S{season:02d}E{episode:02d}.1080p.WEB-DL.DDP5.1.H.264-{group}.mkv",
+    "{title} - {season}x{episode:02d} - Episode Title 720p.mkv",
+    "{title}.{season}{episode:02d}.HDTV.x264-{group}.mp4",
+    "{title}.{year}.2160p.UHD.BluRay.REMUX.HDR.HEVC.Atmos-{group}.mkv",
+    "{title}.s{season}e{episode:02d}.480p.mkv",
+]
+WORDS = ["The", "Last", "Night", "Blue", "House", "River", "Empire", "Signal", "Garden", "Iron"]
+
+def synthetic_names(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(NAME_PATTERNS).format(title=".".join(rng.sample(WORDS, rng.randint(1, 4))),
+                                             season=rng.randint(1, 12), episode=rng.randint(1, 24),
+                                             year=rng.randint(1950, 2025), group=rng.choice(["NTb", "FLUX", "GGEZ"]))
+            for _ in range(count)]
+
+def synthetic_bbcode_args(index, mediainfo_output):
+    is_movie = index % 2 == 0
+    cast = [f"Actor {i}" for i in range(10)]
+    episode_info = None if is_movie else {"title": f"Episode {index}", "plot": "An episode plot. " * 5}
+    creators = "Director Name" if is_movie else ["Creator One", "Creator Two"]
+    writers = ["Writer One", "Writer Two"] if is_movie else None
+    screenshots = [f"https://cdn.speed.cd/u/i/{index}/shot{i}.png" for i in range(4)]
+    return (f"Title {index}", "A plot summary. " * 20, creators, writers, cast,
+            f"https://cdn.speed.cd/u/i/{index}/poster.png", mediainfo_output, screenshots, is_movie, episode_info,
+            f"tt{index:07d}")
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def timing(name, count, seconds):
+    return {"name": name, "calls": count, "seconds": seconds, "us_per_call": seconds / count * 1e6,
+            "calls_per_s": count / seconds}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filename parsing and BBCode formatting")
+    parser.add_argument("--names", type=int, default=10000, help="Number of synthetic filenames")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best is kept")
+    args = parser.parse_args()
+
+    names = synthetic_names(args.names)
+    mediainfo_output = "General:\n" + "Field.................: value\n" * 40
+    bbcode_args = [synthetic_bbcode_args(i, mediainfo_output) for i in range(args.names)]
+    results = [
+        timing("extract_season_episode", len(names),
+               best_time(lambda: [infoscraper.extract_season_episode(name) for name in names], args.repeat)),
+        timing("sanitize_filename", len(names),
+               best_time(lambda: [infoscraper.sanitize_filename(name) for name in names], args.repeat)),
+        timing("format_bbcode", len(bbcode_args),
+               best_time(lambda: [infoscraper.format_bbcode(*a) for a in bbcode_args], args.repeat)),
+    ]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Benchmark of createtorrent's built-in bencode encoder/decoder against bencodepy
+# Builds a synthetic multi-file torrent dict and times encoding and decoding it
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import createtorrent
+
+try:
+    import bencodepy
+except ImportError:
+    bencodepy = None
+
+def synthetic_torrent(file_count, piece_count):
+    files = [{b"length": 1000000 + i, b"path": [b"Season 01", f"episode_{i:05d}.mkv".encode()]}
+             for i in range(file_count)]
+    return {
+        b"announce": b"https://tracker.example/announce",
+        b"info": {
+            b"piece length": 4 * 1024 * 1024,
+            b"private": 1,
+            b"name": b"Synthetic.Pack",
+            b"files": files,
+            b"pieces": os.urandom(piece_count * 20),
+        },
+    }
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(file_count, piece_count, repeat):
+    torrent = synthetic_torrent(file_count, piece_count)
+    encoded = createtorrent.bencode(torrent)
+    results = {
+        "files": file_count,
+        "pieces": piece_count,
+        "encoded_bytes": len(encoded),
+        "builtin_encode_s": best_time(lambda: createtorrent.bencode(torrent), repeat),
+        "builtin_decode_s": best_time(lambda: createtorrent.bdecode(encoded), repeat),
+    }
+    if bencodepy is not None:
+        results["bencodepy_encode_s"] = best_time(lambda: bencodepy.encode(torrent), repeat)
+        results["bencodepy_decode_s"] = best_time(lambda: bencodepy.decode(encoded), repeat)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bencode encoding and decoding")
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 100, 10000], help="File counts to test")
+    parser.add_argument("--pieces", type=int, default=50000, help="Number of pieces in each torrent")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best is kept")
+    args = parser.parse_args()
+
+    if bencodepy is None:
+        print("bencodepy is not installed, only timing the built-in encoder", file=sys.stderr)
+    print(json.dumps([run(file_count, args.pieces, args.repeat) for file_count in args.files], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Benchmark of createtorrent.create_torrent at every determine_piece_size tier
+# Builds a single-file and a many-small-file tree per tier and reports MB/s and peak RSS
+# Files are sparse by default, which measures the read/hash pipeline rather than the disk
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import createtorrent
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# One size inside each tier of the determine_piece_size table, in MiB
+TIER_SIZES_MB = [40, 100, 300, 768, 1536, 3072, 8192, 12288]
+MB = 1024 * 1024
+
+def write_file(path, size, random_data):
+    with open(path, "wb") as f:
+        if not random_data:
+            f.truncate(size)
+            return
+        chunk = os.urandom(MB)
+        for offset in range(0, size, MB):
+            f.write(chunk[:min(MB, size - offset)])
+
+def make_tree(root, layout, size, small_file_size, random_data):
+    """Create `size` bytes of content under root and return the path to pass to create_torrent."""
+    if layout == "single":
+        path = os.path.join(root, "content.bin")
+        write_file(path, size, random_data)
+        return path
+    path = os.path.join(root, "pack")
+    count = max(size // small_file_size, 1)
+    for i in range(count):
+        folder = os.path.join(path, f"disc_{i // 1000:03d}")
+        os.makedirs(folder, exist_ok=True)
+        write_file(os.path.join(folder, f"file_{i:06d}.bin"), small_file_size if i < count - 1
+                   else size - small_file_size * (count - 1), random_data)
+    return path
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+def run_case(path, output, jobs, mode):
+    """Create one torrent in this (fresh) process and return (seconds, peak RSS in MB)."""
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        start = time.perf_counter()
+        createtorrent.create_torrent(path, "http://bench.invalid/announce", output, jobs=jobs, cache_file=None,
+                                     mode=mode)
+        elapsed = time.perf_counter() - start
+    return elapsed, peak_rss_mb()
+
+def check_padded_cache(workdir):
+    """Exit if a --pad torrent built with the per-file cache differs from one built without it.
+
+    x.bin is first hashed alone, where its last piece is not padded, then hardlinked into a
+    two-file pack whose torrent must not reuse that unpadded digest.
+    """
+    root = tempfile.mkdtemp(dir=workdir)
+    try:
+        for folder in ("alone", "pack"):
+            os.makedirs(os.path.join(root, folder))
+        write_file(os.path.join(root, "alone", "x.bin"), 50000, True)
+        os.link(os.path.join(root, "alone", "x.bin"), os.path.join(root, "pack", "x.bin"))
+        write_file(os.path.join(root, "pack", "y.bin"), 30000, True)
+        cache_file = os.path.join(root, "cache.sqlite")
+        outputs = []
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            createtorrent.create_torrent(os.path.join(root, "alone"), "http://bench.invalid/announce",
+                                         os.path.join(root, "alone.torrent"), cache_file=cache_file, pad=True)
+            for cache in (cache_file, None):
+                output = os.path.join(root, f"pack_{len(outputs)}.torrent")
+                createtorrent.create_torrent(os.path.join(root, "pack"), "http://bench.invalid/announce", output,
+                                             cache_file=cache, pad=True)
+                with open(output, "rb") as f:
+                    outputs.append(f.read())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    if outputs[0] != outputs[1]:
+        sys.exit("Cached --pad torrent differs from an uncached one")
+
+def run(size_mb, layout, jobs, mode, small_file_kb, random_data, workdir):
+    size = size_mb * MB
+    root = tempfile.mkdtemp(dir=workdir)
+    try:
+        path = make_tree(root, layout, size, small_file_kb * 1024, random_data)
+        output = os.path.join(root, "bench.torrent")
+        # Every case runs in a new process so peak RSS belongs to that case alone
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            seconds, rss = pool.apply(run_case, (path, output, jobs, mode))
+        table = createtorrent.scan_files(path)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "layout": layout,
+        "size_mb": size_mb,
+        "files": len(table.paths),
+        "piece_size": createtorrent.determine_piece_size(size),
+        "mode": mode,
+        "jobs": jobs,
+        "seconds": seconds,
+        "mb_per_s": size / MB / seconds,
+        "peak_rss_mb": rss,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark create_torrent at each piece size tier")
+    parser.add_argument("--sizes", type=int, nargs="+", default=TIER_SIZES_MB, help="Content sizes in MiB")
+    parser.add_argument("--max-mb", type=int, default=2048, help="Skip sizes above this many MiB")
+    parser.add_argument("--layouts", nargs="+", choices=["single", "many"], default=["single", "many"])
+    parser.add_argument("--small-file-kb", type=int, default=256, help="File size of the many-small-file tree")
+    parser.add_argument("--mode", choices=["v1", "v2", "hybrid"], default="v1", help="Torrent version to create")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Hashing threads")
+    parser.add_argument("--random", action="store_true", help="Write random data instead of sparse files")
+    parser.add_argument("--workdir", default=None, help="Where to create the synthetic trees")
+    args = parser.parse_args()
+
+    check_padded_cache(args.workdir)
+    results = [run(size_mb, layout, args.jobs, args.mode, args.small_file_kb, args.random, args.workdir)
+               for size_mb in args.sizes if size_mb <= args.max_mb for layout in args.layouts]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Benchmark of createtorrent's piece sizing policies across a range of content sizes
+# Reports piece size, piece count and .torrent piece-hash bytes for the fixed table and for
+# target piece counts, plus hashing throughput at each piece size on a scratch file
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import createtorrent
+
+GB = 1024 * 1024 * 1024
+DEFAULT_SIZES_GB = [0.1, 0.5, 1, 4, 10, 25, 50, 100, 200, 500, 1000]
+
+def layout(total_size, piece_size):
+    pieces = math.ceil(total_size / piece_size)
+    return {"piece_size": piece_size, "pieces": pieces, "pieces_bytes": pieces * 20}
+
+def sizing(sizes_gb, targets, max_piece_size):
+    results = []
+    for size_gb in sizes_gb:
+        total_size = int(size_gb * GB)
+        row = {"size_gb": size_gb, "table": layout(total_size, createtorrent.determine_piece_size(total_size))}
+        for target in targets:
+            piece_size = createtorrent.determine_piece_size(total_size, target, max_piece_size)
+            row[f"target_{target}"] = layout(total_size, piece_size)
+        results.append(row)
+    return results
+
+def throughput(scratch_mb, piece_sizes, jobs):
+    results = []
+    with tempfile.NamedTemporaryFile(suffix=".bin") as f:
+        f.write(os.urandom(scratch_mb * 1024 * 1024))
+        f.flush()
+        total_size = os.path.getsize(f.name)
+        for piece_size in piece_sizes:
+            start = time.perf_counter()
+            createtorrent.hash_pieces([f.name], piece_size, total_size, jobs)
+            elapsed = time.perf_counter() - start
+            results.append({"piece_size": piece_size, "seconds": elapsed,
+                            "mb_per_s": total_size / (1024 * 1024) / elapsed})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark piece sizing policies")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES_GB, help="Content sizes in GB")
+    parser.add_argument("--targets", type=int, nargs="+", default=[1000, 2000, 5000], help="Target piece counts")
+    parser.add_argument("--max-piece-size", type=int, choices=[8, 16, 32, 64], default=64, help="Max piece size in MiB")
+    parser.add_argument("--scratch", type=int, default=256, help="Scratch file size in MB for throughput, 0 to skip")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Hashing threads")
+    args = parser.parse_args()
+
+    results = {"sizing": sizing(args.sizes, args.targets, args.max_piece_size << 20)}
+    if args.scratch:
+        piece_sizes = [createtorrent.MIN_PIECE_SIZE << shift for shift in range(0, 13)]
+        results["throughput"] = throughput(args.scratch, piece_sizes, args.jobs)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Benchmark of imgs.process_files against a local stub upload server
+# The stub answers like the speed.cd API after a fixed delay, so only our client-side overhead varies
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import imgs
+import stats
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.latency)
+        body = f"https://cdn.speed.cd/u/i/{random.randrange(10 ** 6)}/bench.png".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub(latency):
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_images(folder, count, size_kb):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"screenshot_{i:04d}.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size_kb * 1024))
+        paths.append(path)
+    return paths
+
+def run(paths, url, cookies, concurrency):
+    args = argparse.Namespace(cookies=cookies, logfile=None, testing=False, separator="pyuploader", verbose=False,
+                              bbcode=True, concurrency=concurrency, retries=0, url=url, cache_file=None,
+                              cache_days=imgs.DEFAULT_CACHE_DAYS, no_cache=True, reencode=False)
+    stats.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        imgs.process_files(paths, args)
+        elapsed = time.perf_counter() - start
+    uploads = stats.get("upload")
+    return {
+        "concurrency": concurrency,
+        "files": len(paths),
+        "seconds": elapsed,
+        "files_per_s": len(paths) / elapsed,
+        "mb_per_s": uploads["bytes"] / 1e6 / elapsed,
+        "mean_latency_s": uploads["seconds"] / uploads["count"] if uploads["count"] else None,
+        "failed": stats.get("upload_failed")["count"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image upload throughput against a stub server")
+    parser.add_argument("--files", type=int, default=64, help="Images uploaded per run")
+    parser.add_argument("--size-kb", type=int, default=500, help="Size of each image")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrency levels")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub waits before answering")
+    args = parser.parse_args()
+
+    server = start_stub(args.latency)
+    url = f"http://127.0.0.1:{server.server_port}/API"
+    with tempfile.TemporaryDirectory() as folder:
+        cookies = os.path.join(folder, "cookies.json")
+        with open(cookies, "w") as f:
+            json.dump({}, f)
+        paths = make_images(folder, args.files, args.size_kb)
+        results = [run(paths, url, cookies, concurrency) for concurrency in args.concurrency]
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
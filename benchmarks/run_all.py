@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# Runs every bench_*.py script in this folder and merges their JSON into one report
+# The report records the git commit and Python version, so runs can be compared between versions
+
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all benchmarks and write one JSON report")
+    parser.add_argument("names", nargs="*", help="Benchmarks to run, e.g. bencode upload (default: all)")
+    parser.add_argument("-o", "--output", help="Write the report here instead of printing it")
+    args = parser.parse_args()
+
+    scripts = sorted(glob.glob(os.path.join(BENCH_DIR, "bench_*.py")))
+    if args.names:
+        scripts = [s for s in scripts if os.path.basename(s)[len("bench_"):-len(".py")] in args.names]
+
+    report = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+              "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": {}}
+    for script in scripts:
+        name = os.path.basename(script)[len("bench_"):-len(".py")]
+        print(f"Running {name}...", file=sys.stderr)
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, script], stdout=subprocess.PIPE, text=True)
+        if completed.returncode:
+            report["results"][name] = {"error": f"exited with code {completed.returncode}"}
+        else:
+            report["results"][name] = json.loads(completed.stdout)
+        print(f"{name} finished in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
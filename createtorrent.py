@@ -4,13 +4,120 @@
 # Now includes -P / --private flag to set torrent as private
 
 import os
+import sys
 import argparse
 import hashlib
 import math
-import bencodepy
+import json
+import sqlite3
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import stats
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'piece_hashes.sqlite')
+DEFAULT_CACHE_SIZE_MB = 256
+BLOCK_SIZE = 16 * 1024  # BEP 52 merkle tree leaf size
+ZERO_HASH = bytes(32)
+MIN_PIECE_SIZE = 16 * 1024
+DEFAULT_MAX_PIECE_SIZE = 16 * 1024 * 1024
+
+# Files left behind by file managers and unfinished downloads, skipped when scanning a folder
+JUNK_NAMES = {"thumbs.db", "desktop.ini", ".ds_store"}
+JUNK_SUFFIXES = (".part", ".partial", ".crdownload", ".!qb", ".!ut", ".bc!", ".aria2")
+
+_BENCODE_TYPES = (bytes, bytearray, memoryview, int, str, list, tuple, dict)
+
+def _bencode_chunks(value, out):
+    kind = type(value)
+    if kind not in _BENCODE_TYPES:
+        # Subclasses such as OrderedDict are encoded like their base type
+        kind = next((base for base in _BENCODE_TYPES if isinstance(value, base)), kind)
+    if kind is bytes or kind is bytearray or kind is memoryview:
+        out.append(b"%d:" % memoryview(value).nbytes)
+        out.append(value)
+    elif kind is int:
+        out.append(b"i%de" % value)
+    elif kind is str:
+        _bencode_chunks(value.encode(), out)
+    elif kind is list or kind is tuple:
+        out.append(b"l")
+        for item in value:
+            _bencode_chunks(item, out)
+        out.append(b"e")
+    elif kind is dict:
+        out.append(b"d")
+        for key, item in sorted((k.encode() if type(k) is str else k, v) for k, v in value.items()):
+            out.append(b"%d:" % len(key))
+            out.append(key)
+            _bencode_chunks(item, out)
+        out.append(b"e")
+    else:
+        raise TypeError(f"Cannot bencode {kind.__name__}")
+
+def bencode_write(f, value):
+    """Write a value bencoded to a binary file, with dictionary keys sorted as BEP 3 requires.
+
+    Encoding only collects references to the pieces of the output, so large byte strings
+    such as the pieces buffer are handed to the file as they are, without being copied.
+    """
+    chunks = []
+    _bencode_chunks(value, chunks)
+    f.writelines(chunks)
+
+def bencode(value):
+    chunks = []
+    _bencode_chunks(value, chunks)
+    return b"".join(chunks)
+
+def _bdecode(data, i):
+    kind = data[i:i + 1]
+    if kind == b"i":
+        end = data.index(b"e", i)
+        return int(data[i + 1:end]), end + 1
+    if kind == b"l":
+        i += 1
+        items = []
+        while data[i:i + 1] != b"e":
+            item, i = _bdecode(data, i)
+            items.append(item)
+        return items, i + 1
+    if kind == b"d":
+        i += 1
+        items = {}
+        while data[i:i + 1] != b"e":
+            key, i = _bdecode(data, i)
+            items[key], i = _bdecode(data, i)
+        return items, i + 1
+    if kind.isdigit():
+        colon = data.index(b":", i)
+        start = colon + 1
+        end = start + int(data[i:colon])
+        if end > len(data):
+            raise ValueError(f"Truncated string at byte {i}")
+        return data[start:end], end
+    raise ValueError(f"Invalid bencode at byte {i}")
+
+def bdecode(data):
+    """Decode bencoded bytes; dictionary keys and strings are returned as bytes."""
+    value, end = _bdecode(data, 0)
+    if end != len(data):
+        raise ValueError(f"Trailing data after byte {end}")
+    return value
+
+def determine_piece_size(total_size, target_pieces=None, max_piece_size=DEFAULT_MAX_PIECE_SIZE):
+    """Determine piece size based on file/folder size (in bytes).
+
+    With target_pieces, pick the smallest power of two from 16 KiB up to max_piece_size
+    that keeps the piece count at or below the target, instead of the fixed table.
+    """
+    if target_pieces:
+        piece_size = MIN_PIECE_SIZE
+        while piece_size < max_piece_size and math.ceil(total_size / piece_size) > target_pieces:
+            piece_size *= 2
+        return piece_size
 
-def determine_piece_size(total_size):
-    """Determine piece size based on file/folder size (in bytes)."""
     mib = total_size / (1024 * 1024)
     if mib < 50:
         return 32 * 1024          # 32 KiB
@@ -29,83 +136,753 @@ def determine_piece_size(total_size):
     else:
         return 8 * 1024 * 1024    # 8 MiB for larger
 
+# One scan of the content: full paths, relative paths (as path component lists), sizes, byte
+# offsets within the torrent, and the mtime/inode/device that identify each file's version
+FileTable = namedtuple("FileTable", "paths parts sizes offsets mtimes_ns inodes devices total_size")
+
+def is_junk(name):
+    lower = name.lower()
+    return lower in JUNK_NAMES or lower.startswith("._") or lower.endswith(JUNK_SUFFIXES)
+
+def _scan_dir(dir_path, include_junk):
+    """Return ([(path, stat)], [subdir]) for one directory, using the stat info scandir provides."""
+    files, subdirs = [], []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file() and (include_junk or not is_junk(entry.name)):
+                # On Windows this stat comes free with the listing, but its st_ino and st_dev are
+                # always 0; file_cache_key() looks the real ones up when it needs them
+                files.append((entry.path, entry.stat()))
+    return files, subdirs
+
+def scan_files(path, jobs=1, include_junk=False):
+    """Stat every file under `path` once and return a FileTable sorted by relative path.
+
+    Directories are listed level by level, on `jobs` threads at a time, which hides the
+    per-directory round trip on network shares.
+    """
+    if os.path.isfile(path):
+        found = [(path, os.stat(path))]
+        base = os.path.dirname(path)
+    else:
+        found = []
+        base = path
+        pending = [path]
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            while pending:
+                subdirs = []
+                for files, children in pool.map(lambda d: _scan_dir(d, include_junk), pending):
+                    found.extend(files)
+                    subdirs.extend(children)
+                pending = subdirs
+    rows = sorted(([p.encode() for p in os.path.relpath(full_path, base).split(os.sep)], full_path, st)
+                  for full_path, st in found)
+    offsets, total = [], 0
+    for _, _, st in rows:
+        offsets.append(total)
+        total += st.st_size
+    return FileTable(paths=[full_path for _, full_path, _ in rows], parts=[parts for parts, _, _ in rows],
+                     sizes=[st.st_size for _, _, st in rows], offsets=offsets,
+                     mtimes_ns=[st.st_mtime_ns for _, _, st in rows], inodes=[st.st_ino for _, _, st in rows],
+                     devices=[st.st_dev for _, _, st in rows], total_size=total)
+
 def get_total_size(path):
     """Calculate total size in bytes of a file or directory."""
-    if os.path.isfile(path):
-        return os.path.getsize(path)
-    total = 0
-    for root, dirs, files in os.walk(path):
-        for f in files:
-            total += os.path.getsize(os.path.join(root, f))
-    return total
-
-def create_torrent(path, announce_url, output_file, private=False):
+    return scan_files(path).total_size
+
+def read_pieces(file_paths, piece_size, slots=1):
+    """Yield consecutive pieces of the concatenated files as memoryviews.
+
+    Data is read with readinto() straight into up to `slots` reused bytearrays, so memory
+    stays bounded by the piece size. A yielded view is only valid until `slots` further
+    pieces have been yielded.
+    """
+    buffers = [bytearray(piece_size)]
+    slot = 0
+    view = memoryview(buffers[0])
+    filled = 0
+    for file_path in file_paths:
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+                if filled == piece_size:
+                    yield view
+                    slot = (slot + 1) % slots
+                    if slot == len(buffers):
+                        buffers.append(bytearray(piece_size))
+                    view = memoryview(buffers[slot])
+                    filled = 0
+    if filled:
+        yield view[:filled]
+
+def piece_window(jobs):
+    """Number of pieces allowed in flight when hashing on `jobs` threads."""
+    return jobs * 2 if jobs > 1 else 1
+
+def for_each_piece(pieces, handle, jobs=1):
+    """Call handle(index, piece) for every (index, piece) pair on up to `jobs` threads.
+
+    At most piece_window(jobs) pieces are in flight, so a reader with one more buffer than
+    that never overwrites a piece still being handled. Stops early and returns False as
+    soon as a call returns False.
+    """
+    pieces = iter(pieces)
+
+    def timed_pieces():
+        # Time spent waiting for the reader vs hashing shows whether the disk or the CPU is the limit
+        while True:
+            start = time.perf_counter()
+            try:
+                index, piece = next(pieces)
+            except StopIteration:
+                return
+            stats.add("read", len(piece) if piece is not None else 0, time.perf_counter() - start)
+            yield index, piece
+
+    def timed_handle(index, piece):
+        start = time.perf_counter()
+        result = handle(index, piece)
+        stats.add("hash", len(piece) if piece is not None else 0, time.perf_counter() - start)
+        return result
+
+    if jobs <= 1:
+        return all(timed_handle(index, piece) is not False for index, piece in timed_pieces())
+    pending = deque()
+    completed = True
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for index, piece in timed_pieces():
+            pending.append(pool.submit(timed_handle, index, piece))
+            if len(pending) >= piece_window(jobs) and pending.popleft().result() is False:
+                completed = False
+                break
+        while pending:
+            if pending.popleft().result() is False:
+                completed = False
+    return completed
+
+def hash_pieces(file_paths, piece_size, total_size, jobs=1):
+    """Return the concatenated SHA-1 digests of every piece of the given files.
+
+    Up to `jobs` worker threads hash pieces concurrently; hashlib releases the GIL while
+    hashing large buffers, so this scales across cores. Digests are written in piece
+    order into a preallocated buffer, so the result is identical at any worker count.
+    """
+    piece_count = math.ceil(total_size / piece_size)
+    digests = bytearray(piece_count * 20)
+
+    def hash_into(index, piece):
+        digests[index * 20:(index + 1) * 20] = hashlib.sha1(piece).digest()
+
+    pieces = enumerate(read_pieces(file_paths, piece_size, slots=piece_window(jobs) + 1))
+    for_each_piece(pieces, hash_into, jobs)
+    return digests
+
+def file_fingerprint(table):
+    """Describe the content by relative path, size, mtime and inode of each file, in order."""
+    return [[os.path.join(*[p.decode() for p in parts]), size, mtime_ns, inode]
+            for parts, size, mtime_ns, inode in zip(table.parts, table.sizes, table.mtimes_ns, table.inodes)]
+
+def _open_cache(cache_file):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    conn = sqlite3.connect(cache_file, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS pieces (
+        key TEXT PRIMARY KEY,
+        root TEXT NOT NULL,
+        piece_length INTEGER NOT NULL,
+        files TEXT NOT NULL,
+        digests BLOB NOT NULL,
+        last_used REAL NOT NULL)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS file_pieces (
+        key TEXT PRIMARY KEY,
+        digests BLOB NOT NULL,
+        last_used REAL NOT NULL)""")
+    return conn
+
+def _evict(conn, max_size_mb):
+    """Delete the least recently used entries of both tables until they fit in max_size_mb."""
+    rows = conn.execute("SELECT 'pieces', key, length(digests) + length(files), last_used FROM pieces "
+                        "UNION ALL SELECT 'file_pieces', key, length(digests), last_used FROM file_pieces "
+                        "ORDER BY 4 DESC").fetchall()
+    budget = max_size_mb * 1024 * 1024
+    used = 0
+    for table, row_key, size, _ in rows:
+        used += size
+        if used > budget:
+            conn.execute(f"DELETE FROM {table} WHERE key = ?", (row_key,))
+
+def _cache_key(root, piece_size, fingerprint):
+    payload = json.dumps([os.path.abspath(root), piece_size, fingerprint])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def load_cached_pieces(cache_file, root, piece_size, fingerprint):
+    """Return cached piece digests for this exact content and piece size, or None."""
+    key = _cache_key(root, piece_size, fingerprint)
+    with _open_cache(cache_file) as conn:
+        row = conn.execute("SELECT digests FROM pieces WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE pieces SET last_used = ? WHERE key = ?", (time.time(), key))
+    conn.close()
+    return bytes(row[0]) if row is not None else None
+
+def load_previous_pieces(cache_file, root, piece_size):
+    """Return (fingerprint, digests) of the last cached run over this root and piece size, or None."""
+    with _open_cache(cache_file) as conn:
+        row = conn.execute("SELECT files, digests FROM pieces WHERE root = ? AND piece_length = ? "
+                           "ORDER BY last_used DESC", (os.path.abspath(root), piece_size)).fetchone()
+    conn.close()
+    return (json.loads(row[0]), bytes(row[1])) if row is not None else None
+
+def store_cached_pieces(cache_file, root, piece_size, fingerprint, digests, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+    """Save piece digests, dropping stale entries for the same root and evicting least recently used ones."""
+    key = _cache_key(root, piece_size, fingerprint)
+    abs_root = os.path.abspath(root)
+    with _open_cache(cache_file) as conn:
+        # Any other entry for this root and piece size describes content that has since changed
+        conn.execute("DELETE FROM pieces WHERE root = ? AND piece_length = ?", (abs_root, piece_size))
+        conn.execute("INSERT OR REPLACE INTO pieces VALUES (?, ?, ?, ?, ?, ?)",
+                     (key, abs_root, piece_size, json.dumps(fingerprint), digests, time.time()))
+        _evict(conn, max_size_mb)
+    conn.close()
+
+def file_cache_key(table, index, piece_size, padded=False):
+    """Identify one file's content by device, inode, size and mtime, so hardlinks share an entry.
+
+    `padded` is part of the key, as a zero-filled last piece hashes differently from a short one.
+    """
+    device, inode = table.devices[index], table.inodes[index]
+    if not inode:
+        # scandir leaves these as 0 on Windows, and without them unrelated files of the same size
+        # and mtime would share cached digests, so ask os.stat, which fills them in
+        st = os.stat(table.paths[index])
+        device, inode = st.st_dev, st.st_ino
+    payload = json.dumps([device, inode, table.sizes[index], table.mtimes_ns[index], piece_size, padded])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def load_cached_file_pieces(cache_file, keys):
+    """Return {key: digests} for the per-file cache entries that exist among `keys`."""
+    found = {}
+    with _open_cache(cache_file) as conn:
+        for key in keys:
+            row = conn.execute("SELECT digests FROM file_pieces WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                found[key] = bytes(row[0])
+                conn.execute("UPDATE file_pieces SET last_used = ? WHERE key = ?", (time.time(), key))
+    conn.close()
+    return found
+
+def store_cached_file_pieces(cache_file, entries, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+    with _open_cache(cache_file) as conn:
+        conn.executemany("INSERT OR REPLACE INTO file_pieces VALUES (?, ?, ?)",
+                         [(key, digests, time.time()) for key, digests in entries.items()])
+        _evict(conn, max_size_mb)
+    conn.close()
+
+def torrent_layout(info):
+    """Return the (relative path, length) of every file in a decoded info dict, in piece order.
+
+    BEP 47 padding files get a relative path of None, as they only exist as zeros.
+    """
+    if b"files" in info:
+        return [(None if b"p" in entry.get(b"attr", b"") else os.path.join(*[p.decode() for p in entry[b"path"]]),
+                 entry[b"length"]) for entry in info[b"files"]]
+    return [(info[b"name"].decode(), info[b"length"])]
+
+def is_v2_only(info):
+    """True for a BEP 52 torrent without the v1 piece hashes that verify and --previous work from."""
+    return b"meta version" in info and b"pieces" not in info
+
+def load_previous_torrent(torrent_file, fingerprint):
+    """Return (piece_size, layout, digests, unchanged) from an earlier .torrent of the same content.
+
+    A .torrent records no timestamps, so a file counts as unchanged when its size still
+    matches and it was not modified after the .torrent was written.
+    """
+    with open(torrent_file, "rb") as f:
+        info = bdecode(f.read())[b"info"]
+    if is_v2_only(info):
+        raise ValueError(f"{torrent_file} is a v2-only torrent and has no v1 piece hashes to reuse")
+    layout = torrent_layout(info)
+    written_ns = os.stat(torrent_file).st_mtime_ns
+    sizes = dict(layout)
+    unchanged = {rel for rel, size, mtime_ns, _ in fingerprint if sizes.get(rel) == size and mtime_ns <= written_ns}
+    return info[b"piece length"], layout, info[b"pieces"], unchanged
+
+def piece_segments(layout, piece_size):
+    """Map each piece to the (relative path, file offset, length) ranges it covers."""
+    segments = []
+    current = []
+    room = piece_size
+    for rel, size in layout:
+        offset = 0
+        while offset < size:
+            length = min(room, size - offset)
+            current.append((rel, offset, length))
+            offset += length
+            room -= length
+            if room == 0:
+                segments.append(current)
+                current = []
+                room = piece_size
+    if current:
+        segments.append(current)
+    return segments
+
+def rehash_changed_pieces(base, fingerprint, piece_size, previous_layout, previous_digests, unchanged, jobs=1):
+    """Rebuild piece digests from a previous run, rehashing only pieces that touch changed files.
+
+    A previous digest is reused only when the piece covers exactly the same byte ranges of
+    the same unchanged files as before, so pieces spanning file boundaries and files that
+    moved because an earlier file grew or shrank are rehashed. Returns (digests, rehashed).
+    """
+    segments = piece_segments([(rel, size) for rel, size, *_ in fingerprint], piece_size)
+    old_segments = piece_segments(previous_layout, piece_size)
+    digests = bytearray(len(segments) * 20)
+    dirty = []
+    for index, piece in enumerate(segments):
+        if (index < len(old_segments) and old_segments[index] == piece
+                and all(rel in unchanged for rel, _, _ in piece)):
+            digests[index * 20:(index + 1) * 20] = previous_digests[index * 20:(index + 1) * 20]
+        else:
+            dirty.append(index)
+
+    def hash_piece(index):
+        buffer = bytearray(piece_size)
+        view = memoryview(buffer)
+        filled = 0
+        for rel, offset, length in segments[index]:
+            with open(os.path.join(base, rel), "rb", buffering=0) as f:
+                f.seek(offset)
+                end = filled + length
+                while filled < end:
+                    n = f.readinto(view[filled:end])
+                    if not n:
+                        raise IOError(f"{rel} is shorter than expected")
+                    filled += n
+        digests[index * 20:(index + 1) * 20] = hashlib.sha1(view[:filled]).digest()
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        list(pool.map(hash_piece, dirty))
+    return digests, len(dirty)
+
+def read_segment_pieces(base, segments, piece_size, slots=1):
+    """Yield (index, view) for each piece described by piece_segments(), reading files in order.
+
+    Unlike read_pieces() a missing or truncated file doesn't shift later data: the pieces
+    covering it are yielded with a view of None and reading carries on with the next file.
+    Views are reused the same way as in read_pieces().
+    """
+    buffers = []
+    current_rel, current_file = None, None
+    try:
+        for index, piece in enumerate(segments):
+            slot = index % slots
+            if slot == len(buffers):
+                buffers.append(bytearray(piece_size))
+            view = memoryview(buffers[slot])
+            filled = 0
+            for rel, offset, length in piece:
+                if rel is None:
+                    view[filled:filled + length] = bytes(length)
+                    filled += length
+                    continue
+                if rel != current_rel:
+                    if current_file:
+                        current_file.close()
+                    current_rel = rel
+                    try:
+                        current_file = open(os.path.join(base, rel), "rb", buffering=0)
+                    except OSError:
+                        current_file = None
+                if current_file is None:
+                    break
+                if current_file.tell() != offset:
+                    current_file.seek(offset)
+                end = filled + length
+                while filled < end:
+                    n = current_file.readinto(view[filled:end])
+                    if not n:
+                        break
+                    filled += n
+                if filled < end:
+                    break
+            complete = filled == sum(length for _, _, length in piece)
+            yield index, view[:filled] if complete else None
+    finally:
+        if current_file:
+            current_file.close()
+
+def verify_torrent(torrent_file, path, jobs=1, fail_fast=False):
+    """Check the data at `path` against a .torrent and return its bad pieces.
+
+    Each bad piece is returned as (index, [(file, start, end), ...]) giving the byte range
+    of every file the piece covers. With fail_fast, checking stops at the first bad piece.
+    """
+    with open(torrent_file, "rb") as f:
+        info = bdecode(f.read())[b"info"]
+    if is_v2_only(info):
+        raise ValueError(f"{torrent_file} is a v2-only torrent; only v1 and hybrid torrents can be verified")
+    piece_size = info[b"piece length"]
+    expected = info[b"pieces"]
+    if b"files" in info:
+        base, layout = path, torrent_layout(info)
+    else:
+        if os.path.isdir(path):
+            path = os.path.join(path, info[b"name"].decode())
+        base, layout = os.path.dirname(path), [(os.path.basename(path), info[b"length"])]
+    segments = piece_segments(layout, piece_size)
+    if len(segments) * 20 != len(expected):
+        raise ValueError(f"{torrent_file} has {len(expected) // 20} piece hashes for {len(segments)} pieces")
+
+    bad = []
+
+    def check(index, piece):
+        if piece is not None and hashlib.sha1(piece).digest() == expected[index * 20:(index + 1) * 20]:
+            return True
+        bad.append((index, [(rel, offset, offset + length) for rel, offset, length in segments[index]
+                            if rel is not None]))
+        return not fail_fast
+
+    pieces = read_segment_pieces(base, segments, piece_size, slots=piece_window(jobs) + 1)
+    for_each_piece(pieces, check, jobs)
+    return sorted(bad)
+
+def next_power_of_two(n):
+    return 1 << max(n - 1, 0).bit_length()
+
+def merkle_root(hashes, width, pad=ZERO_HASH):
+    """SHA-256 merkle root of `hashes` padded to `width` leaves (a power of two) that hash to `pad`."""
+    layer = list(hashes)
+    while width > 1:
+        if len(layer) % 2:
+            layer.append(pad)
+        layer = [hashlib.sha256(layer[i] + layer[i + 1]).digest() for i in range(0, len(layer), 2)]
+        pad = hashlib.sha256(pad + pad).digest()
+        width //= 2
+    return layer[0]
+
+def read_file_pieces(file_paths, piece_size, slots=1):
+    """Yield ((file index, piece index in file, piece index overall), view) with pieces aligned to files.
+
+    Every file starts a new piece, as in v2 and hybrid torrents, so no piece spans two
+    files. Views are reused the same way as in read_pieces().
+    """
+    buffers = []
+    overall = 0
+    for file_index, file_path in enumerate(file_paths):
+        with open(file_path, "rb", buffering=0) as f:
+            piece_index = 0
+            while True:
+                slot = overall % slots
+                if slot == len(buffers):
+                    buffers.append(bytearray(piece_size))
+                view = memoryview(buffers[slot])
+                filled = 0
+                while filled < piece_size:
+                    n = f.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if not filled:
+                    break
+                yield (file_index, piece_index, overall), view[:filled]
+                piece_index += 1
+                overall += 1
+                if filled < piece_size:
+                    break
+
+def hash_v2(file_paths, sizes, piece_size, jobs=1, hybrid=False):
+    """Compute BEP 52 merkle data, plus v1 piece digests for hybrid torrents, in a single read pass.
+
+    Each piece buffer is hashed in 16 KiB SHA-256 blocks for the merkle tree and, when
+    hybrid, with SHA-1 as a v1 piece zero-padded to the piece boundary that the padding
+    files create (a lone file has no padding). Returns (roots, layers, v1 digests or None) where roots[i] is the pieces
+    root of file i (None for empty files) and layers[i] its concatenated piece layer.
+    """
+    blocks_per_piece = piece_size // BLOCK_SIZE
+    piece_roots = [[None] * math.ceil(size / piece_size) for size in sizes]
+    v1_digests = bytearray(sum(len(roots) for roots in piece_roots) * 20) if hybrid else None
+    padded = len(file_paths) > 1
+
+    def hash_piece(key, piece):
+        file_index, piece_index, overall = key
+        blocks = [hashlib.sha256(piece[i:i + BLOCK_SIZE]).digest() for i in range(0, len(piece), BLOCK_SIZE)]
+        # A file of one piece or less gets a tree only as wide as its own blocks
+        width = blocks_per_piece if sizes[file_index] > piece_size else next_power_of_two(len(blocks))
+        piece_roots[file_index][piece_index] = merkle_root(blocks, width)
+        if v1_digests is not None:
+            sha1 = hashlib.sha1(piece)
+            if len(piece) < piece_size and padded:
+                sha1.update(bytes(piece_size - len(piece)))
+            v1_digests[overall * 20:(overall + 1) * 20] = sha1.digest()
+
+    pieces = read_file_pieces(file_paths, piece_size, slots=piece_window(jobs) + 1)
+    for_each_piece(pieces, hash_piece, jobs)
+
+    zero_piece = merkle_root([ZERO_HASH], blocks_per_piece, ZERO_HASH)
+    roots, layers = [], []
+    for size, layer in zip(sizes, piece_roots):
+        if size == 0:
+            roots.append(None)
+        elif size <= piece_size:
+            roots.append(layer[0])
+        else:
+            roots.append(merkle_root(layer, next_power_of_two(len(layer)), zero_piece))
+        layers.append(b"".join(layer))
+    return roots, layers, v1_digests
+
+def file_tree(entries):
+    """Build a BEP 52 file tree from (path parts, length, pieces root) entries."""
+    tree = {}
+    for parts, size, root in entries:
+        node = tree
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        leaf = {b"length": size}
+        if size:
+            leaf[b"pieces root"] = root
+        node[parts[-1]] = {b"": leaf}
+    return tree
+
+def padded_files(files_list, piece_size):
+    """Insert BEP 47 padding files after every file that doesn't end on a piece boundary.
+
+    As libtorrent does, the last file is padded too unless it is the only one, so hybrid
+    torrents of the same content get the same info hash from either tool.
+    """
+    padded = []
+    for entry in files_list:
+        padded.append(entry)
+        pad = -entry[b"length"] % piece_size
+        if pad and len(files_list) > 1:
+            padded.append({b"attr": b"p", b"length": pad, b"path": [b".pad", str(pad).encode()]})
+    return padded
+
+def hash_padded_pieces(table, piece_size, jobs=1, cache_file=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB):
+    """Return v1 piece digests for files laid out with padded_files(), so each starts a new piece.
+
+    Every file's digests then depend on that file alone, so with a cache they are stored
+    per file and reused wherever the same file appears again, such as a hardlinked copy
+    in another pack.
+    """
+    file_paths = table.paths
+    padded = len(file_paths) > 1
+    counts = [math.ceil(size / piece_size) for size in table.sizes]
+    keys = [file_cache_key(table, i, piece_size, padded) for i in range(len(file_paths))] if cache_file else None
+    cached = load_cached_file_pieces(cache_file, keys) if cache_file else {}
+    todo = [i for i in range(len(file_paths)) if keys is None or keys[i] not in cached]
+    fresh = [bytearray(counts[i] * 20) for i in todo]
+
+    def hash_piece(key, piece):
+        todo_index, piece_index, _ = key
+        sha1 = hashlib.sha1(piece)
+        if len(piece) < piece_size and padded:
+            sha1.update(bytes(piece_size - len(piece)))
+        fresh[todo_index][piece_index * 20:(piece_index + 1) * 20] = sha1.digest()
+
+    pieces = read_file_pieces([file_paths[i] for i in todo], piece_size, slots=piece_window(jobs) + 1)
+    for_each_piece(pieces, hash_piece, jobs)
+    if cache_file and todo:
+        store_cached_file_pieces(cache_file, {keys[i]: digests for i, digests in zip(todo, fresh)}, cache_size_mb)
+    if len(todo) < len(file_paths):
+        print(f"♻️ Reused cached piece hashes for {len(file_paths) - len(todo)} of {len(file_paths)} files")
+
+    digests = dict(zip(todo, fresh))
+    return b"".join(digests[i] if i in digests else cached[keys[i]] for i in range(len(file_paths)))
+
+def v1_pieces(path, table, piece_size, jobs=1, cache_file=DEFAULT_CACHE_FILE,
+              cache_size_mb=DEFAULT_CACHE_SIZE_MB, previous_torrent=None):
+    """Return the v1 piece digests, reusing the cache or a previous torrent where possible."""
+    # Reuse digests from an earlier run over the same unchanged content (e.g. a new announce URL)
+    pieces = None
+    previous = None
+    if cache_file or previous_torrent:
+        fingerprint = file_fingerprint(table)
+    if cache_file:
+        pieces = load_cached_pieces(cache_file, path, piece_size, fingerprint)
+        if pieces is not None:
+            print("♻️ Reusing cached piece hashes")
+            return pieces
+        cached = load_previous_pieces(cache_file, path, piece_size)
+        if cached is not None:
+            old_fingerprint, old_digests = cached
+            old_entries = {entry[0]: entry for entry in old_fingerprint}
+            unchanged = {entry[0] for entry in fingerprint if old_entries.get(entry[0]) == entry}
+            previous = ([(rel, size) for rel, size, *_ in old_fingerprint], old_digests, unchanged)
+    if previous is None and previous_torrent:
+        try:
+            old_piece_size, old_layout, old_digests, unchanged = load_previous_torrent(previous_torrent, fingerprint)
+        except ValueError as e:
+            print(f"⚠️ {e}, rehashing everything")
+        else:
+            if old_piece_size == piece_size:
+                previous = (old_layout, old_digests, unchanged)
+            else:
+                print(f"⚠️ {previous_torrent} uses {old_piece_size} byte pieces, rehashing everything")
+    if previous is not None:
+        base = os.path.dirname(path) if os.path.isfile(path) else path
+        pieces, rehashed = rehash_changed_pieces(base, fingerprint, piece_size, *previous, jobs=jobs)
+        print(f"♻️ Rehashed {rehashed} of {len(pieces) // 20} pieces")
+    else:
+        pieces = hash_pieces(table.paths, piece_size, table.total_size, jobs)
+    if cache_file:
+        store_cached_pieces(cache_file, path, piece_size, fingerprint, pieces, cache_size_mb)
+    return pieces
+
+def create_torrent(path, announce_url, output_file, private=False, jobs=1,
+                   cache_file=DEFAULT_CACHE_FILE, cache_size_mb=DEFAULT_CACHE_SIZE_MB, previous_torrent=None,
+                   mode="v1", target_pieces=None, max_piece_size=DEFAULT_MAX_PIECE_SIZE, pad=False,
+                   include_junk=False, progress=False):
+    """Create a .torrent; `mode` is "v1", "v2" (BEP 52 only) or "hybrid" (both, sharing one read pass).
+
+    target_pieces and max_piece_size are passed to determine_piece_size(). With pad, a v1
+    torrent gets BEP 47 padding files so every file starts on a piece boundary. Junk files
+    (see is_junk()) in a folder are left out unless include_junk is set. With progress, a
+    live hashing progress bar is drawn on stderr when it is a terminal.
+    """
     torrent_dict = {b"announce": announce_url.encode(), b"info": {}}
 
-    total_size = get_total_size(path)
-    piece_size = determine_piece_size(total_size)
+    with stats.timed("scan"):
+        table = scan_files(path, jobs, include_junk)
+    total_size = table.total_size
+    piece_size = determine_piece_size(total_size, target_pieces, max_piece_size)
     torrent_dict[b"info"][b"piece length"] = piece_size
 
     # Add private flag if requested
     if private:
         torrent_dict[b"info"][b"private"] = 1
 
+    files_list = [{b"length": size, b"path": parts} for size, parts in zip(table.sizes, table.parts)]
     if os.path.isfile(path):
-        with open(path, "rb") as f:
-            data = f.read()
         torrent_dict[b"info"][b"name"] = os.path.basename(path).encode()
-        pieces = b""
-        for i in range(0, len(data), piece_size):
-            piece = data[i:i+piece_size]
-            pieces += hashlib.sha1(piece).digest()
-        torrent_dict[b"info"][b"pieces"] = pieces
-        torrent_dict[b"info"][b"length"] = len(data)
     else:
         torrent_dict[b"info"][b"name"] = os.path.basename(os.path.normpath(path)).encode()
-        files_list = []
-        for root, dirs, files in os.walk(path):
-            for f in files:
-                full_path = os.path.join(root, f)
-                rel_path = os.path.relpath(full_path, path)
-                path_parts = [p.encode() for p in rel_path.split(os.sep)]
-                files_list.append({b"length": os.path.getsize(full_path), b"path": path_parts})
         torrent_dict[b"info"][b"files"] = files_list
 
-        pieces = b""
-        buffer = b""
-        for file_entry in files_list:
-            file_path = os.path.join(path, *[p.decode() for p in file_entry[b"path"]])
-            with open(file_path, "rb") as f:
-                while True:
-                    read_data = f.read(piece_size - len(buffer))
-                    if not read_data:
-                        break
-                    buffer += read_data
-                    while len(buffer) >= piece_size:
-                        pieces += hashlib.sha1(buffer[:piece_size]).digest()
-                        buffer = buffer[piece_size:]
-        if buffer:
-            pieces += hashlib.sha1(buffer).digest()
-        torrent_dict[b"info"][b"pieces"] = pieces
+    hash_start = time.perf_counter()
+    with stats.Progress("read", total_size, "Hashing", enabled=progress), stats.timed("torrent", total_size):
+        if mode == "v1" and pad and not os.path.isfile(path):
+            torrent_dict[b"info"][b"files"] = padded_files(files_list, piece_size)
+            torrent_dict[b"info"][b"pieces"] = hash_padded_pieces(table, piece_size, jobs, cache_file, cache_size_mb)
+        elif mode == "v1":
+            torrent_dict[b"info"][b"pieces"] = v1_pieces(path, table, piece_size, jobs,
+                                                         cache_file, cache_size_mb, previous_torrent)
+            if os.path.isfile(path):
+                torrent_dict[b"info"][b"length"] = total_size
+        else:
+            sizes = table.sizes
+            roots, layers, v1_digests = hash_v2(table.paths, sizes, piece_size, jobs, hybrid=mode == "hybrid")
+            torrent_dict[b"info"][b"meta version"] = 2
+            torrent_dict[b"info"][b"file tree"] = file_tree(
+                (entry[b"path"], size, root) for entry, size, root in zip(files_list, sizes, roots))
+            # Files of one piece or less are verified by their pieces root alone
+            torrent_dict[b"piece layers"] = {root: layer for size, root, layer in zip(sizes, roots, layers)
+                                             if size > piece_size}
+            if mode == "hybrid":
+                torrent_dict[b"info"][b"pieces"] = v1_digests
+                if os.path.isfile(path):
+                    torrent_dict[b"info"][b"length"] = total_size
+                else:
+                    torrent_dict[b"info"][b"files"] = padded_files(files_list, piece_size)
+            else:
+                torrent_dict[b"info"].pop(b"files", None)
+
+    hash_seconds = time.perf_counter() - hash_start
 
     # Write torrent file
     with open(output_file, "wb") as f:
-        f.write(bencodepy.encode(torrent_dict))
+        bencode_write(f, torrent_dict)
 
     print(f"✅ Torrent created: {output_file}")
     print(f"Piece size: {piece_size} bytes")
+    print(f"⏱️ {total_size / 1e6:.1f} MB in {hash_seconds:.1f}s ({total_size / 1e6 / max(hash_seconds, 1e-9):.1f} MB/s)")
+    if mode != "v1":
+        print(f"🧬 BitTorrent {'v1 + v2 hybrid' if mode == 'hybrid' else 'v2'} torrent")
     if private:
         print("🔒 Torrent marked as PRIVATE")
 
+def verify_main(argv):
+    parser = argparse.ArgumentParser(prog="createtorrent.py verify",
+                                     description="Check data on disk against an existing .torrent file")
+    parser.add_argument("torrent", help="The .torrent file")
+    parser.add_argument("path", help="Path to the file or folder the torrent was created from")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of hashing threads (default: number of CPU cores)")
+    parser.add_argument("-x", "--fail-fast", action="store_true", help="Stop at the first bad piece")
+    parser.add_argument("--stats-json", metavar="FILE", help="Write read/hash timings to FILE as JSON on exit")
+    args = parser.parse_args(argv)
+    stats.dump_json_at_exit(args.stats_json)
+
+    try:
+        bad = verify_torrent(args.torrent, args.path, jobs=args.jobs, fail_fast=args.fail_fast)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    except (KeyError, TypeError):
+        # Valid bencode, but not a dictionary with an info dictionary in it
+        print(f"❌ {args.torrent} is not a .torrent file", file=sys.stderr)
+        return 2
+    if not bad:
+        print(f"✅ All pieces of {args.torrent} match {args.path}")
+        return 0
+    for index, ranges in bad:
+        files = ", ".join(f"{rel} bytes {start}-{end - 1}" for rel, start, end in ranges)
+        print(f"❌ Piece {index}: {files}")
+    print(f"{len(bad)} bad piece(s)" + (" (stopped at the first one)" if args.fail_fast else ""))
+    return 1
+
 def main():
-    parser = argparse.ArgumentParser(description="Create a .torrent file")
+    if len(sys.argv) > 1 and sys.argv[1] == "verify":
+        sys.exit(verify_main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Create a .torrent file",
+                                     epilog="Use 'createtorrent.py verify TORRENT PATH' to check data against a .torrent")
     parser.add_argument("--announce", required=True, help="Tracker announce URL")
     parser.add_argument("path", help="Path to file or folder")
     parser.add_argument("--output", required=True, help="Output .torrent file path")
     parser.add_argument("-P", "--private", action="store_true", help="Mark torrent as private")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of hashing threads (default: number of CPU cores)")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help="Piece hash cache database")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help="Maximum piece hash cache size in MB")
+    parser.add_argument("--no-cache", action="store_true", help="Always rehash and don't update the cache")
+    parser.add_argument("--previous", metavar="TORRENT",
+                        help="Earlier .torrent of this content; only pieces of files changed since it was written are rehashed")
+    parser.add_argument("--piece-count", type=int,
+                        help="Pick the smallest piece size that gives at most this many pieces")
+    parser.add_argument("--torrent-size", type=int, metavar="KB",
+                        help="Pick the smallest piece size that keeps the piece hashes within this many KB")
+    parser.add_argument("--max-piece-size", type=int, choices=[8, 16, 32, 64], metavar="MIB",
+                        help="Largest piece size --piece-count/--torrent-size may pick (8, 16, 32 or 64; default "
+                             f"{DEFAULT_MAX_PIECE_SIZE >> 20}); only valid with one of them")
+    parser.add_argument("--pad", action="store_true",
+                        help="Add padding files so every file starts on a piece boundary (always on for --v2/--hybrid)")
+    parser.add_argument("--include-junk", action="store_true",
+                        help="Keep Thumbs.db, .DS_Store, partial downloads and similar files in folders")
+    parser.add_argument("--stats-json", metavar="FILE", help="Write scan/read/hash timings to FILE as JSON on exit")
+    version = parser.add_mutually_exclusive_group()
+    version.add_argument("--v2", dest="mode", action="store_const", const="v2", default="v1",
+                         help="Create a BitTorrent v2 (BEP 52) torrent")
+    version.add_argument("--hybrid", dest="mode", action="store_const", const="hybrid",
+                         help="Create a torrent usable by both v1 and v2 clients")
     args = parser.parse_args()
+    stats.dump_json_at_exit(args.stats_json)
 
-    create_torrent(args.path, args.announce, args.output, private=args.private)
+    target_pieces = args.piece_count or (args.torrent_size * 1024 // 20 if args.torrent_size else None)
+    # Without a target the fixed size table is used, which never goes past 8 MiB
+    if args.max_piece_size and not target_pieces:
+        parser.error("--max-piece-size needs --piece-count or --torrent-size")
+    max_piece_size = args.max_piece_size << 20 if args.max_piece_size else DEFAULT_MAX_PIECE_SIZE
+    create_torrent(args.path, args.announce, args.output, private=args.private, jobs=args.jobs,
+                   cache_file=None if args.no_cache else args.cache_file, cache_size_mb=args.cache_size,
+                   previous_torrent=args.previous, mode=args.mode, target_pieces=target_pieces,
+                   max_piece_size=max_piece_size, pad=args.pad, include_junk=args.include_junk,
+                   progress=True)
 
 if __name__ == "__main__":
     main()
@@ -6,29 +6,51 @@ import glob
 import sys
 import json
 import os
+import time
+import hashlib
+import sqlite3
 import requests
 import datetime
+import io
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from requests_toolbelt import MultipartEncoder
 import re
 
-ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'gif', 'png', 'bmp', 'ico', 'svg', 'svgz', 'tif', 'tiff', 'raw', 'webp', 'heic'}
+import stats
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
-def upload_img(image_path, speed_cookies: dict, bound='pyuploaded', logfile=None):
-    multipart_boundary_separator = bound
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'gif', 'png', 'bmp', 'ico', 'svg', 'svgz', 'tif', 'tiff', 'raw', 'webp', 'heic'}
+API_URL = 'https://speed.cd/API'
+MAX_FILE_SIZE = 2000000
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'uploads.sqlite')
+DEFAULT_CACHE_DAYS = 180
+REDACTED_HEADERS = {'cookie', 'set-cookie', 'authorization'}
+_upload_loggers = {}
+_upload_loggers_lock = threading.Lock()
 
-    multipartdata = MultipartEncoder(
-        fields={
-            'MAX_FILE_SIZE': '2000000',
-            'jxt': '5',
-            'jxw': 'img',
-            'a': '1',
-            'file': ((os.path.basename(image_path)), open(image_path, 'rb'), 'image/jpeg')
-        },
-        boundary=multipart_boundary_separator
-    )
+def make_session(concurrency=1):
+    """Keep-alive session whose connection pool is large enough for every upload worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 1))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
+def upload_headers(url, multipartdata):
     myheaders = {
-        'Host': 'speed.cd',
+        'Host': urlparse(url).netloc,
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/png,image/svg+xml,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
@@ -43,45 +65,156 @@ def upload_img(image_path, speed_cookies: dict, bound='pyuploaded', logfile=None
         'Sec-Fetch-User': '?1',
         'Priority': 'u=4'
     }
+    return myheaders
+
+def reencoded_name(image_path):
+    return re.sub(r'\.\w+$', '.jpeg', os.path.basename(image_path))
+
+def reencode_image(image_path, max_bytes=MAX_FILE_SIZE):
+    """Re-encode an image as JPEG in memory at the highest quality that fits in max_bytes.
+
+    Quality is binary searched; if even the lowest quality is too large, the image is
+    scaled down by a quarter and the search repeated.
+    """
+    with Image.open(image_path) as image:
+        image = image.convert('RGB')
+    while True:
+        best = None
+        low, high = 50, 95
+        while low <= high:
+            quality = (low + high) // 2
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                best = buffer.getvalue()
+                low = quality + 1
+            else:
+                high = quality - 1
+        if best is not None:
+            return best
+        image = image.resize((max(image.width * 3 // 4, 1), max(image.height * 3 // 4, 1)), Image.LANCZOS)
+
+def post_img(session, url, image_path, speed_cookies: dict, bound, timeout=60, retries=3, backoff=1.0,
+             image_data=None):
+    """POST an image, retrying with exponential backoff on timeouts, connection errors and 5xx replies.
+
+    If image_data is given it is sent from memory instead of reading image_path.
+    """
+    for attempt in range(retries + 1):
+        if image_data is None:
+            image_file, file_name = open(image_path, 'rb'), os.path.basename(image_path)
+        else:
+            image_file, file_name = io.BytesIO(image_data), reencoded_name(image_path)
+        with image_file:
+            multipartdata = MultipartEncoder(
+                fields={
+                    'MAX_FILE_SIZE': str(MAX_FILE_SIZE),
+                    'jxt': '5',
+                    'jxw': 'img',
+                    'a': '1',
+                    'file': (file_name, image_file, 'image/jpeg')
+                },
+                boundary=bound
+            )
+            try:
+                response = session.post(url=url, data=multipartdata, cookies=speed_cookies,
+                                        headers=upload_headers(url, multipartdata), timeout=timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if attempt == retries:
+                    raise
+                print(f"Retrying {image_path} after error: {e}", file=sys.stderr)
+                time.sleep(backoff * 2 ** attempt)
+                continue
+        if response.status_code < 500 or attempt == retries:
+            return response, multipartdata
+        print(f"Retrying {image_path} after server returned code {response.status_code}", file=sys.stderr)
+        time.sleep(backoff * 2 ** attempt)
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format a record whose message is a dict as one JSON object per line."""
 
-    response = requests.post(url='https://speed.cd/API', data=multipartdata, cookies=speed_cookies, headers=myheaders)
+    def format(self, record):
+        entry = {'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')}
+        entry.update(record.msg)
+        return json.dumps(entry, default=str)
+
+def upload_logger(logfile):
+    """Return a logger writing JSON lines to `logfile` from a background thread.
+
+    Uploads only format a small dict and put it on an in-memory queue; a QueueListener does
+    the file writes, so a slow disk never holds up an upload. Listeners are stopped, flushing what is
+    left, when the process exits.
+    """
+    path = os.path.abspath(logfile)
+    with _upload_loggers_lock:
+        logger = _upload_loggers.get(path)
+        if logger is None:
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, logging.FileHandler(path, encoding='utf-8'))
+            listener.start()
+            atexit.register(listener.stop)
+            logger = logging.getLogger(f'imgs.upload.{path}')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            queue_handler.setFormatter(JsonLinesFormatter())
+            logger.addHandler(queue_handler)
+            _upload_loggers[path] = logger
+    return logger
+
+def redact_headers(headers):
+    return {k: '<redacted>' if k.lower() in REDACTED_HEADERS else v for k, v in headers.items()}
+
+def try_upload_img(image_path, speed_cookies: dict, bound='pyuploaded', logfile=None, session=None, url=API_URL,
+                   timeout=60, retries=3, image_data=None):
+    """Upload one image and return (url, None) on success or (None, error message) on failure.
+
+    With a logfile, one JSON line per upload records the request and response headers
+    (cookies redacted), status and timings, but never the image or response body.
+    """
+    start = time.perf_counter()
+    try:
+        response, multipartdata = post_img(session or requests.Session(), url, image_path, speed_cookies, bound,
+                                           timeout=timeout, retries=retries, image_data=image_data)
+    except requests.RequestException as e:
+        if logfile is not None:
+            upload_logger(logfile).info({'file': image_path, 'url': url, 'error': str(e),
+                                         'total_seconds': round(time.perf_counter() - start, 3)})
+        return None, f"Error: \n\tUpload of {image_path} failed: {e}"
 
     pattern = r"https://cdn\.speed\.cd/u/i/\d+/[\w-]+\.[a-z]+"
     match = re.search(pattern, str(response.content).replace("\\", ""))
 
-    if (logfile is not None):
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open('response_details.txt', 'a') as fileout:
-            fileout.write(f'\n\n--- Response at {current_time} ---\n')
-            fileout.write(f'File Info:\n')
-            fileout.write(f'\tFile Name: {image_path}\n')
-            fileout.write(f'\tFile Size: {str(multipartdata.len)}\n')
-            fileout.write(f'\tFile Type: {multipartdata.content_type}\n')
-            fileout.write("Request:\n")
-            fileout.write(f"\tRequest Headers: \n\t\t{response.request.headers}\n")
-            fileout.write(f"\tRequest Body: \n\t\t{response.request.body}\n")
-            fileout.write("Response:\n")
-            fileout.write(f"\tStatus Code: {response.status_code}\n")
-            fileout.write(f"\tHeaders: {response.headers}\n")
-            fileout.write(f"\tContent: {response.content}\n")
-            fileout.write(f"\tText: {response.text}\n")
-            fileout.write(f"\tRaw: {response.raw}\n")
-            fileout.write(f"\tCookies: {str(response.cookies.values())}\n")
-        fileout.close()
+    if logfile is not None:
+        upload_logger(logfile).info({
+            'file': image_path,
+            'bytes': multipartdata.len,
+            'content_type': multipartdata.content_type,
+            'url': url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'request_headers': redact_headers(response.request.headers),
+            'response_headers': redact_headers(response.headers),
+            'response_seconds': round(response.elapsed.total_seconds(), 3),
+            'total_seconds': round(time.perf_counter() - start, 3),
+            'result': match.group() if match else None,
+        })
 
     if match:
-        return (match.group())
+        return match.group(), None
+    elif response.status_code != 200:
+        return None, f"Error: \n\tServer returned code {response.status_code}\n\t{response.reason}\n\t{str(response.content)}"
     else:
-        if response.status_code != 200:
-            print(
-                f"Error: \n\tServer returned code {response.status_code}\n\t{response.reason}\n\t{str(response.content)}",
-                file=sys.stderr)
-            return -1
-        else:
-            print(
-                f"Unspecified Error (Server returned OK):\n\t{str(response.content)}\n\t{str(response.reason)}\n\t{response.raw}",
-                file=sys.stderr)
-            return -1
+        return None, f"Unspecified Error (Server returned OK):\n\t{str(response.content)}\n\t{str(response.reason)}\n\t{response.raw}"
+
+def upload_img(image_path, speed_cookies: dict, bound='pyuploaded', logfile=None, session=None, url=API_URL,
+               timeout=60, retries=3):
+    new_url, error = try_upload_img(image_path, speed_cookies, bound=bound, logfile=logfile, session=session,
+                                    url=url, timeout=timeout, retries=retries)
+    if error:
+        print(error, file=sys.stderr)
+        return -1
+    return new_url
 
 def load_cookies(cookie_path: str):
     with open(cookie_path) as json_file:
@@ -89,7 +222,46 @@ def load_cookies(cookie_path: str):
         json_file.close()
     return cookies
 
-def is_file_valid(f):
+def image_digest(image_path):
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _open_cache(cache_file):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    conn = sqlite3.connect(cache_file, timeout=30)
+    # Urls are only valid for the endpoint that returned them, so a stub server's urls never reach real uploads
+    conn.execute("""CREATE TABLE IF NOT EXISTS upload_urls (
+        endpoint TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        url TEXT NOT NULL,
+        uploaded REAL NOT NULL,
+        PRIMARY KEY (endpoint, digest))""")
+    return conn
+
+def load_cached_url(cache_file, endpoint, digest, max_age_days=DEFAULT_CACHE_DAYS):
+    """Return the CDN url an identical image was uploaded to through endpoint, unless the entry has expired."""
+    with _open_cache(cache_file) as conn:
+        row = conn.execute("SELECT url FROM upload_urls WHERE endpoint = ? AND digest = ? AND uploaded >= ?",
+                           (endpoint, digest, time.time() - max_age_days * 86400)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def store_cached_url(cache_file, endpoint, digest, url, max_age_days=DEFAULT_CACHE_DAYS):
+    with _open_cache(cache_file) as conn:
+        conn.execute("INSERT OR REPLACE INTO upload_urls VALUES (?, ?, ?, ?)", (endpoint, digest, url, time.time()))
+        conn.execute("DELETE FROM upload_urls WHERE uploaded < ?", (time.time() - max_age_days * 86400,))
+    conn.close()
+
+def purge_url_cache(cache_file):
+    with _open_cache(cache_file) as conn:
+        purged = conn.execute("DELETE FROM upload_urls").rowcount
+    conn.close()
+    return purged
+
+def is_file_valid(f, reencode=False):
     if not os.path.exists(f):
         print(f"Warning: {f} does not exist and will be ignored.", file=sys.stderr)
         return False
@@ -97,8 +269,13 @@ def is_file_valid(f):
         print(f"Warning: {f} has an invalid extension and will be ignored.\n\t"
               f"Valid extensions are: {str(ALLOWED_EXTENSIONS)}", file=sys.stderr)
         return False
-    if os.path.getsize(f) > 2000000:
-        sub = re.sub(r'\.\w+$', '.jpeg', os.path.basename(f))
+    if os.path.getsize(f) > MAX_FILE_SIZE:
+        if reencode and Image is not None:
+            return True
+        if reencode:
+            print("Warning: Pillow is not installed, oversized images can't be re-encoded automatically.",
+                  file=sys.stderr)
+        sub = reencoded_name(f)
         print(f"Warning - Max Image Size Exceeded - Ignoring file:\n\t"
               f"{os.path.basename(f)} is {os.path.getsize(f) / 1000} KB. Max allowed size is 2000 KB.\n\t"
               f"Run the following command to reencode the image to an allowed size:\n"
@@ -107,20 +284,124 @@ def is_file_valid(f):
         return False
     return True
 
+@dataclass
+class UploadResult:
+    path: str
+    url: str = None
+    error: str = None
+    bytes: int = 0
+    latency: float = 0.0
+    cached: bool = False
+
+class Uploader:
+    """In-process uploader for use from other scripts.
+
+    All uploads share one keep-alive session, and upload_many() returns one UploadResult
+    per input path, in input order, whether or not the upload succeeded.
+    """
+
+    def __init__(self, cookies: dict, concurrency=4, retries=3, url=API_URL, bound='pyuploader', logfile=None,
+                 cache_file=DEFAULT_CACHE_FILE, cache_days=DEFAULT_CACHE_DAYS, testing=False, verbose=False,
+                 reencode=False, reencode_jobs=None):
+        self.cookies = cookies
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self.url = url
+        self.bound = bound
+        self.logfile = logfile
+        self.cache_file = cache_file
+        self.cache_days = cache_days
+        self.testing = testing
+        self.verbose = verbose
+        self.reencode = reencode and Image is not None
+        self.reencode_jobs = reencode_jobs
+        self.session = make_session(self.concurrency)
+
+    def upload(self, image_path, reencoded=None):
+        """Upload one image; `reencoded` is a future for its in-memory re-encode, if it was too large."""
+        start = time.perf_counter()
+        result = UploadResult(path=image_path)
+        if not is_file_valid(image_path, reencode=self.reencode):
+            result.error = f"{image_path} is not a valid image"
+            return result
+        result.bytes = os.path.getsize(image_path)
+        print(f"Uploading {image_path}...") if self.verbose else None
+        if self.testing:
+            result.url = f"https://speed.cd/u/i/testing/{os.path.basename(image_path)}"
+            return result
+
+        # Identical bytes were uploaded before, so reuse that url instead of sending them again
+        digest = image_digest(image_path) if self.cache_file else None
+        if digest:
+            result.url = load_cached_url(self.cache_file, self.url, digest, self.cache_days)
+            if result.url:
+                print(f"{image_path} already uploaded, reusing {result.url}") if self.verbose else None
+                result.cached = True
+                result.latency = time.perf_counter() - start
+                stats.add("upload_cached", result.bytes, result.latency)
+                return result
+
+        image_data = None
+        if reencoded is not None:
+            try:
+                image_data = reencoded.result()
+            except Exception as e:
+                result.error = f"Could not re-encode {image_path}: {e}"
+                stats.add("upload_failed")
+                return result
+            result.bytes = len(image_data)
+            print(f"Re-encoded {image_path} to {len(image_data) / 1000} KB") if self.verbose else None
+
+        result.url, result.error = try_upload_img(image_path, self.cookies, bound=self.bound, logfile=self.logfile,
+                                                  session=self.session, url=self.url, retries=self.retries,
+                                                  image_data=image_data)
+        result.latency = time.perf_counter() - start
+        stats.add("upload" if result.url else "upload_failed", result.bytes, result.latency)
+        if digest and result.url:
+            store_cached_url(self.cache_file, self.url, digest, result.url, self.cache_days)
+        return result
+
+    def upload_many(self, image_paths):
+        if not self.reencode or self.testing:
+            # map() yields results in input order even though uploads finish out of order
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                return list(pool.map(self.upload, image_paths))
+
+        # Oversized images are re-encoded on a process pool while the others are already uploading
+        oversized = [p for p in image_paths if os.path.isfile(p) and os.path.getsize(p) > MAX_FILE_SIZE]
+        with ProcessPoolExecutor(max_workers=self.reencode_jobs) as encoders, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            reencoded = {p: encoders.submit(reencode_image, p) for p in oversized}
+            return list(pool.map(self.upload, image_paths, [reencoded.get(p) for p in image_paths]))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 def process_files(file_list, args):
-    urls = []
     print(f"Starting upload of {len(file_list)} files:") if args.verbose and len(file_list) > 1 else None
-    cookies_from_file = load_cookies(args.cookies)
+    uploader = Uploader(load_cookies(args.cookies), concurrency=args.concurrency, retries=args.retries,
+                        url=args.url, bound=args.separator, logfile=args.logfile,
+                        cache_file=None if args.no_cache else args.cache_file, cache_days=args.cache_days,
+                        testing=args.testing, verbose=args.verbose, reencode=args.reencode)
+    with uploader, stats.Progress(("upload", "upload_cached", "upload_failed"), len(file_list), "Uploading",
+                                  enabled=not args.verbose, unit="count"):
+        results = uploader.upload_many(file_list)
 
     urls = []
-    for f in file_list:
-        print(f"Uploading {f}...") if args.verbose else None
-        new_url = f"https://speed.cd/u/i/testing/{os.path.basename(f)}" if args.testing else upload_img(f, speed_cookies=cookies_from_file, bound=args.separator, logfile=args.logfile)
-        if(type(new_url)==str):
-            urls.append([new_url, f])
-            print(f"{f} successfuly uploaded to {new_url}")  if args.verbose else None
+    for result in results:
+        if result.url:
+            urls.append([result.url, result.path])
+            print(f"{result.path} successfuly uploaded to {result.url} "
+                  f"({result.bytes / 1000:.0f} KB in {result.latency:.2f}s)")  if args.verbose else None
         else:
-            print(f"{f} failed to upload") if args.verbose else None
+            print(result.error, file=sys.stderr)
+            print(f"{result.path} failed to upload") if args.verbose else None
 
     if args.bbcode:
         [print(f"[img={os.path.basename(uf[1])}]{uf[0]}[/img]") for uf in urls]
@@ -130,8 +411,8 @@ def process_files(file_list, args):
 def main():
     # region parser_setup
     parser = argparse.ArgumentParser(description="Upload images to speed.cd\nWildcards and multiple")
-    parser.add_argument('-c', '--cookies', type=str, help='path to the cookies file', required=True)
-    parser.add_argument('-l', '--logfile', type=str, default=None, help='path to the output log file')
+    parser.add_argument('-c', '--cookies', type=str, help='path to the cookies file, required when uploading files')
+    parser.add_argument('-l', '--logfile', type=str, default=None, help='append a JSON line per upload (headers, status, timings) to this file')
     parser.add_argument('-t', '--testing', action='store_true', default=False,
                         help='preview the files to be uploaded without actually uploading')
     parser.add_argument('-s', '--separator', type=str, default='pyuploader',
@@ -139,10 +420,35 @@ def main():
     parser.add_argument('-v', '--verbose', action='store_true', default=False, help='increase output verbosity')
     parser.add_argument('-b', '--bbcode', action='store_true', default=False,
                         help='output urls formatted as bbcode (useful for integrating into bash scripts)')
-    parser.add_argument('files', nargs='+', help='file paths or patterns to process')
+    parser.add_argument('-n', '--concurrency', type=int, default=4, help='number of simultaneous uploads')
+    parser.add_argument('-r', '--retries', type=int, default=3,
+                        help='retries per file on timeouts and server errors')
+    parser.add_argument('-u', '--url', type=str, default=API_URL,
+                        help='upload endpoint, e.g. a local stub server for testing')
+    parser.add_argument('--cache-file', type=str, default=DEFAULT_CACHE_FILE,
+                        help='database mapping image content hashes to previously uploaded urls')
+    parser.add_argument('--cache-days', type=float, default=DEFAULT_CACHE_DAYS,
+                        help='days before a cached url expires and the image is uploaded again')
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help='always upload, even if identical images were uploaded before')
+    parser.add_argument('--purge-cache', action='store_true', default=False,
+                        help='remove every cached url before processing files')
+    parser.add_argument('-z', '--reencode', action='store_true', default=False,
+                        help='re-encode images over 2000 KB to JPEG in memory instead of skipping them (needs Pillow)')
+    parser.add_argument('--stats-json', type=str, default=None,
+                        help='write upload latency and byte counts as JSON to this file on exit')
+    parser.add_argument('files', nargs='*', help='file paths or patterns to process')
 
     args = parser.parse_args()
+    if args.files and not args.cookies:
+        parser.error("the following arguments are required to upload files: -c/--cookies")
     # endregion
+    stats.dump_json_at_exit(args.stats_json)
+
+    if args.purge_cache:
+        print(f"Purged {purge_url_cache(args.cache_file)} cached urls")
+        if not args.files:
+            return
 
     if args.verbose:
         print("Verbose mode is enabled")
@@ -161,7 +467,7 @@ def main():
             possible_files.append(file_pattern) # Individual file
 
     possible_files = list(dict.fromkeys(possible_files))
-    valid_files = [file for file in possible_files if is_file_valid(file)]
+    valid_files = [file for file in possible_files if is_file_valid(file, reencode=args.reencode)]
 
     if (len(valid_files) == 0):
         print("Error - No valid files to process!", file=sys.stderr)
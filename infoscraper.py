@@ -10,39 +10,85 @@ except Exception:
 
 import requests
 import subprocess
-import tkinter as tk
-from tkinter import filedialog
 import os
 import re
 import sys
 import json
+import sqlite3
+import time
+import argparse
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import createtorrent
+import imgs
+import mediaprobe
+import stats
 
 template = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template_mediainfo.txt')
+TMDB_API_URL = "https://api.themoviedb.org/3"
+TMDB_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'tmdb.sqlite')
+TMDB_CACHE_HOURS = 24
+TMDB_API_KEY = "<Your_TMDB_Key"
+ANNOUNCE_URL = "https://speed.connecting.center/b180195da10f22531cb88bf6dbc80fc7/announce"
+TORRENT_CACHE_DIR = r"\\TOWER\seed\incoming\_torrent_cache\speed"
+VIDEO_EXTENSIONS = {'.mkv', '.mp4', '.m4v', '.avi', '.ts', '.m2ts', '.mov', '.wmv'}
+# S01E02 or a standalone 1x02, so resolutions like 1920x1080 don't count
+EPISODE_MARKER = re.compile(r's(\d{1,2})e(\d{2})|(?<!\d)(\d{1,2})x(\d{2})(?!\d)', re.IGNORECASE)
+_tmdb_session = None
+_claimed_outputs_lock = threading.Lock()
 
-def upload_images_via_imgs_py(image_paths, cookies_file="cookies.json"):
-    import subprocess
-    cmd = ["python", "imgs.py", "-c", cookies_file] + image_paths
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        output_lines = result.stdout.strip().splitlines()
-        urls = []
-        for line in output_lines:
-            if ": " in line:
-                urls.append(line.split(": ", 1)[1].strip())
-        if len(urls) != len(image_paths):
-            print(f"Warning: number of returned URLs ({len(urls)}) does not match number of images ({len(image_paths)})")
-            urls.extend([None] * (len(image_paths) - len(urls)))
-        return urls
-    except Exception as e:
-        print(f"Error uploading images via imgs.py: {e}")
-        return [None] * len(image_paths)
+def upload_images(image_paths, cookies_file="cookies.json"):
+    """Upload images in-process with imgs.Uploader, returning one url (or None) per path in order."""
+    with imgs.Uploader(imgs.load_cookies(cookies_file), reencode=True) as uploader:
+        results = uploader.upload_many(image_paths)
+    for result in results:
+        if result.error:
+            print(f"Error uploading {result.path}: {result.error}")
+    return [result.url for result in results]
+
+def tmdb_session():
+    """Shared keep-alive session for every TMDb request made by this process."""
+    global _tmdb_session
+    if _tmdb_session is None:
+        _tmdb_session = requests.Session()
+    return _tmdb_session
+
+def _open_tmdb_cache(cache_file):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    conn = sqlite3.connect(cache_file, timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL, fetched REAL NOT NULL)")
+    return conn
 
-def get_movie_info(tmdb_id, api_key):
-    url = f"https://api.themoviedb.org/3/movie/{tmdb_id}?api_key={api_key}"
-    data = requests.get(url).json()
+def tmdb_get(path, api_key, cache_file=TMDB_CACHE_FILE, ttl_hours=TMDB_CACHE_HOURS, base_url=TMDB_API_URL, **params):
+    """GET a TMDb API path as JSON, reusing a cached response younger than ttl_hours."""
+    # Responses from a stub or mirror TMDb must not be served for the real API, and vice versa
+    key = f"{base_url}/{path}?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    if cache_file:
+        with _open_tmdb_cache(cache_file) as conn:
+            row = conn.execute("SELECT body FROM responses WHERE key = ? AND fetched >= ?",
+                               (key, time.time() - ttl_hours * 3600)).fetchone()
+        conn.close()
+        if row:
+            stats.add("tmdb_cached")
+            return json.loads(row[0])
+    with stats.timed("tmdb"):
+        response = tmdb_session().get(f"{base_url}/{path}", params={'api_key': api_key, **params}, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    if cache_file:
+        with _open_tmdb_cache(cache_file) as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, json.dumps(data), time.time()))
+        conn.close()
+    return data
+
+def get_movie_info(tmdb_id, api_key, **tmdb_options):
+    # append_to_response returns details and credits in a single request
+    data = tmdb_get(f"movie/{tmdb_id}", api_key, append_to_response="credits", **tmdb_options)
     title = data.get('title', 'Title not available')
     plot_summary = data.get('overview', 'Plot summary not available')
-    credits_data = requests.get(f"https://api.themoviedb.org/3/movie/{tmdb_id}/credits?api_key={api_key}").json()
+    credits_data = data['credits']
     director = next((m['name'] for m in credits_data['crew'] if m['job'] == 'Director'), 'Director information not available')
     writers = [m['name'] for m in credits_data['crew'] if m['department'] == 'Writing']
     cast = [a['name'] for a in credits_data['cast'][:5]]
@@ -51,18 +97,26 @@ def get_movie_info(tmdb_id, api_key):
     imdb_id = data.get('imdb_id')
     return title, plot_summary, director, writers, cast, poster_url, imdb_id
 
-def get_tv_series_info(tmdb_id, api_key, season=None, episode=None):
-    data = requests.get(f"https://api.themoviedb.org/3/tv/{tmdb_id}?api_key={api_key}").json()
+def get_tv_series_info(tmdb_id, api_key, season=None, episode=None, **tmdb_options):
+    # The show (with credits and external ids appended) and the episode are fetched concurrently
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        show_future = pool.submit(tmdb_get, f"tv/{tmdb_id}", api_key,
+                                  append_to_response="credits,external_ids", **tmdb_options)
+        episode_future = None
+        if season is not None and episode is not None:
+            episode_future = pool.submit(tmdb_get, f"tv/{tmdb_id}/season/{season}/episode/{episode}", api_key,
+                                         **tmdb_options)
+        data = show_future.result()
+        episode_data = episode_future.result() if episode_future else None
     title = data.get('name', 'Title not available')
     plot_summary = data.get('overview', 'Plot summary not available')
-    credits_data = requests.get(f"https://api.themoviedb.org/3/tv/{tmdb_id}/credits?api_key={api_key}").json()
+    credits_data = data['credits']
     creators = [c['name'] for c in data.get('created_by', [])]
     cast = [a['name'] for a in credits_data['cast'][:5]]
     poster_path = data.get('poster_path')
     poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
     episode_info = None
-    if season is not None and episode is not None:
-        episode_data = requests.get(f"https://api.themoviedb.org/3/tv/{tmdb_id}/season/{season}/episode/{episode}?api_key={api_key}").json()
+    if episode_data is not None:
         episode_info = {
             'title': episode_data.get('name', 'Episode title not available'),
             'plot': episode_data.get('overview', 'Episode plot not available')
@@ -99,57 +153,285 @@ def format_bbcode(title, plot_summary, creators_or_director, writers, cast, post
     return bbcode
 
 def select_video_file():
+    # Imported here so headless batch runs don't need Tk installed
+    import tkinter as tk
+    from tkinter import filedialog
     root = tk.Tk()
     root.withdraw()
     return filedialog.askopenfilename()
 
-def create_screenshots(video_path):
-    screenshots_folder = os.path.join(os.path.dirname(__file__), 'screenshots')
+def screenshot_times(duration, count):
+    """Spread `count` timestamps evenly across the video, skipping the very start and end."""
+    return [duration * (i + 1) / (count + 1) for i in range(count)]
+
+def create_screenshots(video_path, count=4, duration=None, jobs=None, screenshots_folder=None):
+    """Grab `count` frames evenly spread over the video, running one ffmpeg per frame in parallel.
+
+    -ss before -i makes ffmpeg seek the input directly to the nearest keyframe, so each
+    process only reads a little data around its timestamp, even over a network share.
+    Pass `duration` to reuse an earlier probe; otherwise the file is probed with mediaprobe.
+    """
+    screenshots_folder = screenshots_folder or os.path.join(os.path.dirname(__file__), 'screenshots')
     os.makedirs(screenshots_folder, exist_ok=True)
 
-    import re
-    result = subprocess.run(
-        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-         '-of', 'default=noprint_wrappers=1:nokey=1', video_path],
-        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
-    match = re.search(r'(\d+\.\d+)', result.stdout)
-    if not match:
-        raise ValueError(f"Could not parse duration from ffprobe output: {result.stdout}")
-    duration = float(match.group(1))
-
-    start_time = 5 * 60
-    screenshot_interval = 5 * 60
-    max_screenshots = 4
-    screenshot_paths = []
-    for i in range(start_time, min(int(duration), start_time + screenshot_interval * max_screenshots), screenshot_interval):
-        screenshot_path = os.path.join(screenshots_folder, f'screenshot_{i//screenshot_interval + 1}.jpg')
-        subprocess.run(['ffmpeg', '-ss', str(i), '-i', video_path, '-vframes', '1', '-q:v', '2', screenshot_path],
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        screenshot_paths.append(screenshot_path)
-    return screenshot_paths
+    if duration is None:
+        duration = mediaprobe.probe_media(video_path).duration
+    if not duration:
+        raise ValueError(f"Could not read the duration of {video_path}")
+
+    def grab(index, seconds):
+        screenshot_path = os.path.join(screenshots_folder, f'screenshot_{index + 1}.jpg')
+        if os.path.exists(screenshot_path):
+            os.remove(screenshot_path)
+        with stats.timed("ffmpeg_frame"):
+            subprocess.run(['ffmpeg', '-nostdin', '-y', '-ss', f'{seconds:.3f}', '-i', video_path,
+                            '-frames:v', '1', '-q:v', '2', screenshot_path],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return screenshot_path
+
+    times = screenshot_times(duration, count)
+    with ThreadPoolExecutor(max_workers=jobs or count or 1) as pool:
+        screenshot_paths = list(pool.map(grab, range(len(times)), times))
+    return [path for path in screenshot_paths if os.path.exists(path)]
 
 def sanitize_filename(filename):
     sanitized = re.sub(r'[\\/:*?"<>|]', '', filename)
     return "_".join(sanitized.split())
 
 def extract_season_episode(filename):
+    # An explicit marker wins over a year or resolution earlier in the name
+    marker = EPISODE_MARKER.search(filename)
+    if marker:
+        return int(marker.group(1) or marker.group(3)), int(marker.group(2) or marker.group(4))
     filename = re.sub(r'(1080p|720p)', '', filename, flags=re.IGNORECASE)
-    match = re.search(r'(s?(\d{1,2})[x|e](\d{2}))|(\d{3})|(\d{4})', filename, re.IGNORECASE)
+    # 4 digits are tried before 3, so 0304 is S03E04 rather than 030 followed by a stray 4
+    match = re.search(r'(s?(\d{1,2})[x|e](\d{2}))|(\d{4})|(\d{3})', filename, re.IGNORECASE)
     if match:
         if match.group(2) and match.group(3):
             return int(match.group(2)), int(match.group(3))
         elif match.group(4):
             ep = match.group(4)
-            if len(ep) == 3:
-                return int(ep[0]), int(ep[1:])
-        elif match.group(5):
-            ep = match.group(5)
             if len(ep) == 4:
                 return int(ep[:2]), int(ep[2:])
+        elif match.group(5):
+            ep = match.group(5)
+            if len(ep) == 3:
+                return int(ep[0]), int(ep[1:])
     return None, None
 
+def stage(limits, name):
+    """Context manager that holds one of the `name` stage slots, or does nothing without limits."""
+    return limits[name] if limits else nullcontext()
+
+def process_video(video_path, media_type, tmdb_id, api_key, season=None, episode=None, screenshot_count=4,
+                  cookies_file="cookies.json", limits=None, claimed_outputs=None, tmdb_url=TMDB_API_URL):
+    """Build and save the BBCode for one video, returning the output file path.
+
+    `limits` maps the stage names metadata, screenshots, upload and mediainfo to
+    semaphores, so concurrent calls from a batch run overlap without overloading any stage.
+    `claimed_outputs`, shared by a batch, maps each BBCode file already written to its video;
+    a second video that would overwrite one of them fails instead.
+    `tmdb_url` is the TMDb API base url, e.g. a local stub for testing.
+    """
+    with stage(limits, 'metadata'):
+        if media_type == 'movie':
+            title, plot_summary, director, writers, cast, poster_url, imdb_id = get_movie_info(tmdb_id, api_key, base_url=tmdb_url)
+            creators_or_director = director
+            episode_info = None
+        else:
+            title, plot_summary, creators, cast, poster_url, episode_info, imdb_id = get_tv_series_info(tmdb_id, api_key, season, episode,
+                                                                                                        base_url=tmdb_url)
+            creators_or_director = creators
+            writers = None
+
+        # Collect images to upload, in a folder of their own so concurrent videos don't collide
+        work_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots',
+                                   sanitize_filename(os.path.splitext(os.path.basename(video_path))[0]))
+        os.makedirs(work_folder, exist_ok=True)
+        image_paths = []
+        if poster_url:
+            poster_path = os.path.join(work_folder, "poster.jpg")
+            with open(poster_path, 'wb') as f, stats.timed("poster"):
+                f.write(tmdb_session().get(poster_url, timeout=30).content)
+            image_paths.append(poster_path)
+
+    # One cached probe serves both the screenshot timestamps and the mediainfo text
+    with stage(limits, 'mediainfo'):
+        probe = mediaprobe.probe_media(video_path)
+
+    with stage(limits, 'screenshots'):
+        screenshot_paths = create_screenshots(video_path, count=screenshot_count, duration=probe.duration,
+                                              screenshots_folder=work_folder)
+        image_paths.extend(screenshot_paths)
+
+    with stage(limits, 'upload'):
+        print(f"Uploading images for {os.path.basename(video_path)}...")
+        image_urls = upload_images(image_paths, cookies_file)
+    poster_link = image_urls[0] if poster_url else None
+    screenshot_links = image_urls[1:] if poster_url else image_urls
+
+    # Cleanup local images
+    for path in image_paths:
+        if os.path.exists(path):
+            os.remove(path)
+    if not os.listdir(work_folder):
+        os.rmdir(work_folder)
+
+    mediainfo_output = mediaprobe.render_template(probe, template)
+
+    bbcode = format_bbcode(
+        title, plot_summary, creators_or_director, writers, cast,
+        poster_link, mediainfo_output, screenshot_links,
+        media_type == 'movie', episode_info, imdb_id
+    )
+
+    bbcode_folder = os.path.join(os.path.dirname(__file__), 'bbcode')
+    os.makedirs(bbcode_folder, exist_ok=True)
+    name = title if episode_info is None else f"{title} S{season:02d}E{episode:02d}"
+    output_filename = os.path.join(bbcode_folder, sanitize_filename(name) + ".txt")
+    if claimed_outputs is not None:
+        with _claimed_outputs_lock:
+            if output_filename in claimed_outputs:
+                raise ValueError(f"{output_filename} was already written for {claimed_outputs[output_filename]}")
+            claimed_outputs[output_filename] = video_path
+    with open(output_filename, 'w', encoding='utf-8') as f:
+        f.write(bbcode)
+    print(f"BBCode saved to {output_filename}")
+    return output_filename
+
+def torrent_output_path(video_folder, media_type, torrent_dir=TORRENT_CACHE_DIR):
+    last_folder_name = os.path.basename(os.path.normpath(video_folder))
+    return os.path.join(torrent_dir, 'movies' if media_type == 'movie' else 'tv', f"{last_folder_name}.torrent")
+
+def find_videos(path):
+    if os.path.isfile(path):
+        return [path]
+    videos = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        videos.extend(os.path.join(root, f) for f in sorted(files)
+                      if os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS)
+    return videos
+
+def batch_item(video_path, tmdb_id, media_type=None, season=None, episode=None):
+    """Describe one video of a batch, working out movie vs TV episode from the filename if not given."""
+    name = os.path.basename(video_path)
+    # Only an explicit S01E02 / 1x02 marker means an episode; bare 3-4 digit numbers are usually years
+    if media_type is None:
+        media_type = 'tv' if EPISODE_MARKER.search(name) else 'movie'
+    # Without a marker the type was given as tv, so 102 / 0102 style numbering is trusted too
+    if media_type == 'tv' and season is None and episode is None:
+        season, episode = extract_season_episode(name)
+    return {'path': video_path, 'type': media_type, 'tmdb_id': tmdb_id, 'season': season, 'episode': episode}
+
+def load_manifest(manifest_path):
+    """Read a JSON list of {"path", "tmdb_id", optional "type", "season", "episode"} entries."""
+    with open(manifest_path, encoding='utf-8') as f:
+        entries = json.load(f)
+    items = []
+    for entry in entries:
+        for video_path in find_videos(entry['path']):
+            items.append(batch_item(video_path, entry['tmdb_id'], entry.get('type'),
+                                    entry.get('season'), entry.get('episode')))
+    return items
+
+def run_batch(items, api_key, cookies_file="cookies.json", screenshot_count=4, torrent_dir=TORRENT_CACHE_DIR,
+              announce_url=ANNOUNCE_URL, stage_limits=None, workers=4, hash_workers=1, tmdb_url=TMDB_API_URL):
+    """Process many videos as an overlapping pipeline, returning the number of failed items.
+
+    Each video runs through metadata, screenshots, upload and mediainfo on its own worker,
+    with per-stage semaphores capping how many videos are in each stage at once. Torrents,
+    one per video folder, are hashed on a separate pool from the start, so CPU-bound hashing
+    overlaps with the network and ffmpeg work.
+    """
+    stage_limits = {'metadata': 4, 'screenshots': 2, 'upload': 2, 'mediainfo': 2, **(stage_limits or {})}
+    limits = {name: threading.Semaphore(max(n, 1)) for name, n in stage_limits.items()}
+    folders = {}
+    for item in items:
+        folders.setdefault(os.path.dirname(os.path.abspath(item['path'])), item['type'])
+
+    # Items for the same title and episode would all write the same BBCode file
+    failures = 0
+    unique = {}
+    for item in items:
+        key = (item['type'], item['tmdb_id'], item['season'], item['episode'])
+        if key in unique:
+            failures += 1
+            print(f"❌ {item['path']}: same TMDb id and episode as {unique[key]['path']}, skipped")
+        else:
+            unique[key] = item
+    claimed_outputs = {}
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as hashers, ThreadPoolExecutor(max_workers=workers) as pool:
+        torrent_futures = {}
+        if torrent_dir:
+            for folder, media_type in folders.items():
+                output_path = torrent_output_path(folder, media_type, torrent_dir)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                torrent_futures[hashers.submit(createtorrent.create_torrent, folder, announce_url, output_path,
+                                               private=True, jobs=os.cpu_count() or 1)] = folder
+        item_futures = {
+            pool.submit(process_video, item['path'], item['type'], item['tmdb_id'], api_key, item['season'],
+                        item['episode'], screenshot_count, cookies_file, limits, claimed_outputs,
+                        tmdb_url): item['path']
+            for item in unique.values()
+        }
+        for future in as_completed(item_futures):
+            if future.exception():
+                failures += 1
+                print(f"❌ {item_futures[future]}: {future.exception()}")
+        for future in as_completed(torrent_futures):
+            if future.exception():
+                failures += 1
+                print(f"❌ Torrent for {torrent_futures[future]}: {future.exception()}")
+    print(f"Batch finished: {len(items) + len(torrent_futures) - failures} succeeded, {failures} failed")
+    return failures
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(description="Generate BBCode, screenshots and torrents for a folder of videos")
+    parser.add_argument("paths", nargs="*", help="Video files or folders to process")
+    parser.add_argument("--manifest", help="JSON list of {path, tmdb_id, type, season, episode} entries")
+    parser.add_argument("--tmdb-id", help="TMDb id for every video given in paths")
+    parser.add_argument("--type", choices=['movie', 'tv'], help="Media type; guessed from filenames if omitted")
+    parser.add_argument("--api-key", default=TMDB_API_KEY, help="TMDb API key")
+    parser.add_argument("--tmdb-url", default=TMDB_API_URL, help="TMDb API base url, e.g. a local stub for testing")
+    parser.add_argument("--cookies", default="cookies.json", help="speed.cd cookies file")
+    parser.add_argument("--screenshots", type=int, default=4, help="Screenshots per video")
+    parser.add_argument("--torrent-dir", default=TORRENT_CACHE_DIR, help="Where to write .torrent files")
+    parser.add_argument("--no-torrent", action="store_true", help="Don't create torrents")
+    parser.add_argument("--workers", type=int, default=4, help="Videos in flight at once")
+    parser.add_argument("--metadata-jobs", type=int, default=4, help="Concurrent TMDb lookups")
+    parser.add_argument("--screenshot-jobs", type=int, default=2, help="Videos taking screenshots at once")
+    parser.add_argument("--upload-jobs", type=int, default=2, help="Videos uploading images at once")
+    parser.add_argument("--mediainfo-jobs", type=int, default=2, help="Concurrent mediainfo probes")
+    parser.add_argument("--hash-jobs", type=int, default=1, help="Torrents hashed at once")
+    parser.add_argument("--stats-json", metavar="FILE", help="Write per-stage timings to FILE as JSON on exit")
+    args = parser.parse_args(argv)
+    stats.dump_json_at_exit(args.stats_json)
+
+    items = load_manifest(args.manifest) if args.manifest else []
+    if args.paths:
+        if not args.tmdb_id:
+            parser.error("--tmdb-id is required when passing paths")
+        for path in args.paths:
+            items.extend(batch_item(video_path, args.tmdb_id, args.type) for video_path in find_videos(path))
+    if not items:
+        parser.error("no videos found")
+
+    stage_limits = {'metadata': args.metadata_jobs, 'screenshots': args.screenshot_jobs,
+                    'upload': args.upload_jobs, 'mediainfo': args.mediainfo_jobs}
+    failures = run_batch(items, args.api_key, args.cookies, args.screenshots,
+                         None if args.no_torrent else args.torrent_dir, stage_limits=stage_limits,
+                         workers=args.workers, hash_workers=args.hash_jobs, tmdb_url=args.tmdb_url)
+    stats.print_summary()
+    sys.exit(1 if failures else 0)
+
 def main():
+    # Any command line arguments mean a headless batch run
+    if len(sys.argv) > 1:
+        batch_main(sys.argv[1:])
+        return
+
     try:
         print("Starting Media Info BBCode Generator...")
         media_type = input("Is this for a movie or TV show? (movie/tv): ").strip().lower()
@@ -158,79 +440,42 @@ def main():
             return
 
         tmdb_id = input("Enter TMDB ID: ")
-        api_key = "<Your_TMDB_Key"
+        api_key = TMDB_API_KEY
 
         video_path = select_video_file()
         video_folder = os.path.dirname(video_path)
 
-        if media_type == 'movie':
-            title, plot_summary, director, writers, cast, poster_url, imdb_id = get_movie_info(tmdb_id, api_key)
-            creators_or_director = director
-            episode_info = None
-        else:
+        season, episode = None, None
+        if media_type == 'tv':
             tv_scope = input("Is this for the entire series or a single episode? (series/episode): ").strip().lower()
             if tv_scope == 'episode':
                 season, episode = extract_season_episode(os.path.basename(video_path))
                 if not season or not episode:
                     print("Failed to extract season and episode from filename.")
                     return
-            else:
-                season, episode = None, None
-            title, plot_summary, creators, cast, poster_url, episode_info, imdb_id = get_tv_series_info(tmdb_id, api_key, season, episode)
-            creators_or_director = creators
-            writers = None
-
-        # Collect images to upload
-        image_paths = []
-        if poster_url:
-            poster_path = "poster.jpg"
-            with open(poster_path, 'wb') as f:
-                f.write(requests.get(poster_url).content)
-            image_paths.append(poster_path)
 
-        screenshot_paths = create_screenshots(video_path)
-        image_paths.extend(screenshot_paths)
+        # Hashing is the longest step, so it runs in the background while the
+        # network-bound metadata, screenshot and upload work happens here
+        bbcode_error = None
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            print("Creating torrent in the background...")
+            torrent_future = pool.submit(
+                createtorrent.create_torrent, video_folder, ANNOUNCE_URL,
+                torrent_output_path(video_folder, media_type), private=True, jobs=os.cpu_count() or 1
+            )
+            try:
+                process_video(video_path, media_type, tmdb_id, api_key, season, episode)
+            except Exception as e:
+                bbcode_error = e
+            if bbcode_error is None and not torrent_future.done():
+                print("Waiting for torrent hashing to finish...")
+            torrent_error = torrent_future.exception()
 
-        # Upload images via imgs.py
-        print("Uploading images via imgs.py...")
-        image_urls = upload_images_via_imgs_py(image_paths)
-        poster_link = image_urls[0] if poster_url else None
-        screenshot_links = image_urls[1:] if poster_url else image_urls
-
-        # Cleanup local images
-        for path in image_paths:
-            if os.path.exists(path):
-                os.remove(path)
-
-        mediainfo_output = subprocess.check_output(['mediainfo', '--Inform=file://' + template, video_path], text=True)
-
-        bbcode = format_bbcode(
-            title, plot_summary, creators_or_director, writers, cast,
-            poster_link, mediainfo_output, screenshot_links,
-            media_type == 'movie', episode_info, imdb_id
-        )
-
-        bbcode_folder = os.path.join(os.path.dirname(__file__), 'bbcode')
-        os.makedirs(bbcode_folder, exist_ok=True)
-        output_filename = os.path.join(bbcode_folder, sanitize_filename(title) + ".txt")
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            f.write(bbcode)
-        print(f"BBCode saved to {output_filename}")
-
-        last_folder_name = os.path.basename(os.path.normpath(video_folder))
-        if media_type == 'movie':
-            output_path = rf"\\TOWER\seed\incoming\_torrent_cache\speed\movies\{last_folder_name}.torrent"
-        else:
-            output_path = rf"\\TOWER\seed\incoming\_torrent_cache\speed\tv\{last_folder_name}.torrent"
-
-        createtorrent_cmd = [
-            "python", "createtorrent.py", "-P", "--announce",
-            "https://speed.connecting.center/b180195da10f22531cb88bf6dbc80fc7/announce",
-            video_folder, "--output", output_path
-        ]
-        print("Running createtorrent.py...")
-        subprocess.run(createtorrent_cmd, check=True)
-        print("createtorrent.py finished successfully!")
+        if bbcode_error is not None:
+            print(f"An error occurred while generating BBCode: {bbcode_error}")
+        if torrent_error is not None:
+            print(f"An error occurred while creating the torrent: {torrent_error}")
+        stats.print_summary()
 
     except Exception as e:
         print(f"An error occurred: {e}")
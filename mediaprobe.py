@@ -0,0 +1,130 @@
+# Probes video files once with MediaInfo and caches the parsed result
+# Screenshot planning and the mediainfo template in infoscraper both read the same probe
+
+import os
+import re
+import json
+import time
+import sqlite3
+import subprocess
+from dataclasses import dataclass, field
+
+import stats
+
+try:
+    from pymediainfo import MediaInfo
+except ImportError:
+    MediaInfo = None
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'media.sqlite')
+SECTION_PATTERN = re.compile(r'^(General|Video|Audio|Text|Other|Image|Menu);(.*)$')
+FIELD_PATTERN = re.compile(r'%([^%]+)%')
+ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+@dataclass
+class MediaProbe:
+    path: str
+    duration: float = None
+    bitrate: int = None
+    size: int = None
+    general: dict = field(default_factory=dict)
+    streams: list = field(default_factory=list)
+
+    def streams_of(self, kind):
+        """Return the Video, Audio, Text, ... tracks of one kind, in file order."""
+        return [track for track in self.streams if track.get('@type') == kind]
+
+def _number(value, kind):
+    try:
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def parse_tracks(path, tracks):
+    """Build a MediaProbe from the track list of MediaInfo's full JSON output."""
+    general = next((track for track in tracks if track.get('@type') == 'General'), {})
+    return MediaProbe(path=path, duration=_number(general.get('Duration'), float),
+                      bitrate=_number(general.get('OverallBitRate'), int), size=_number(general.get('FileSize'), int),
+                      general=general, streams=[track for track in tracks if track is not general])
+
+def run_mediainfo(path):
+    """Return MediaInfo's full JSON track list, through libmediainfo if pymediainfo is installed."""
+    if MediaInfo is not None and MediaInfo.can_parse():
+        output = MediaInfo.parse(path, output='JSON', full=True)
+    else:
+        output = subprocess.check_output(['mediainfo', '--Output=JSON', '-f', path], text=True)
+    return json.loads(output)['media']['track']
+
+def _open_cache(cache_file):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    conn = sqlite3.connect(cache_file, timeout=30)
+    conn.execute("""CREATE TABLE IF NOT EXISTS probes (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        tracks TEXT NOT NULL,
+        probed REAL NOT NULL)""")
+    return conn
+
+def probe_media(path, cache_file=DEFAULT_CACHE_FILE):
+    """Probe a file once, reusing the cached probe while its size and mtime are unchanged."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    if cache_file:
+        with _open_cache(cache_file) as conn:
+            row = conn.execute("SELECT tracks FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                               (path, st.st_size, st.st_mtime_ns)).fetchone()
+        conn.close()
+        if row:
+            stats.add("mediainfo_cached")
+            return parse_tracks(path, json.loads(row[0]))
+    with stats.timed("mediainfo"):
+        tracks = run_mediainfo(path)
+    if cache_file:
+        with _open_cache(cache_file) as conn:
+            conn.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                         (path, st.st_size, st.st_mtime_ns, json.dumps(tracks), time.time()))
+        conn.close()
+    return parse_tracks(path, tracks)
+
+def load_template(template_path):
+    """Read a mediainfo --Inform template file into {stream kind: text with %Field% references}.
+
+    Follows mediainfo's rules: a section runs until the next "Kind;" line, its line breaks
+    are kept except trailing ones, double quotes are dropped, \\n and \\r become newlines
+    and \\\\ a single backslash.
+    """
+    sections = {}
+    kind = None
+    with open(template_path, encoding='utf-8') as f:
+        for line in f.read().splitlines():
+            match = SECTION_PATTERN.match(line)
+            if match:
+                kind = match.group(1)
+                sections[kind] = [match.group(2)]
+            elif kind:
+                sections[kind].append(line)
+    unescape = {'n': '\n', 'r': '\n', '\\': '\\'}
+    return {kind: ESCAPE_PATTERN.sub(lambda m: unescape.get(m.group(1), m.group(0)),
+                                     '\n'.join(lines).rstrip('\n').replace('"', ''))
+            for kind, lines in sections.items()}
+
+def field_value(track, name):
+    """Look up a template field such as Format/Info or Channel(s)/String in a JSON track."""
+    if name == 'Format_Profile':
+        # The template syntax still has the combined Profile@Level@Tier value that JSON splits up
+        level = track.get('Format_Level')
+        parts = [track.get('Format_Profile'), level and f'L{level}', track.get('Format_Tier')]
+        return '@'.join(part for part in parts if part)
+    value = track.get(name.replace('(s)', 's').replace('/', '_'), '')
+    return value if isinstance(value, str) else ''
+
+def render_template(probe, template_path):
+    """Render a mediainfo --Inform template from a probe, without running mediainfo again."""
+    sections = load_template(template_path)
+    output = []
+    for track in [probe.general] + probe.streams:
+        text = sections.get(track.get('@type'))
+        if text is not None:
+            output.append(FIELD_PATTERN.sub(lambda m: field_value(track, m.group(1)), text))
+    return ''.join(output)
@@ -0,0 +1,130 @@
+# Timing and throughput counters shared by createtorrent, imgs and infoscraper
+# Every stage adds to named counters; a TTY progress bar and --stats-json read them back
+
+import sys
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters = {}
+_started = time.time()
+
+def add(name, nbytes=0, seconds=0.0, count=1):
+    """Add `count` events taking `seconds` in total and moving `nbytes` to counter `name`."""
+    with _lock:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = _counters[name] = {"count": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0}
+        counter["count"] += count
+        counter["bytes"] += nbytes
+        counter["seconds"] += seconds
+        if count:
+            counter["max_seconds"] = max(counter["max_seconds"], seconds / count)
+
+@contextmanager
+def timed(name, nbytes=0):
+    """Time the body of a with block as one `name` event."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, nbytes, time.perf_counter() - start)
+
+def get(name):
+    with _lock:
+        return dict(_counters.get(name, {"count": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0}))
+
+def snapshot():
+    """Return every counter with its mean time per event and MB/s where they apply."""
+    with _lock:
+        counters = {name: dict(counter) for name, counter in _counters.items()}
+    for counter in counters.values():
+        counter["mean_seconds"] = counter["seconds"] / counter["count"] if counter["count"] else 0.0
+        if counter["bytes"] and counter["seconds"]:
+            counter["mb_per_s"] = counter["bytes"] / counter["seconds"] / 1e6
+    return {"wall_seconds": time.time() - _started, "counters": counters}
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+    _started = time.time()
+
+def dump_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+def dump_json_at_exit(path):
+    """Write the counters to `path` as JSON when the process exits, if a path was given."""
+    if path:
+        atexit.register(dump_json, path)
+
+def print_summary(file=sys.stdout):
+    for name, counter in sorted(snapshot()["counters"].items()):
+        line = f"⏱️ {name}: {counter['count']} in {counter['seconds']:.2f}s (mean {counter['mean_seconds']:.3f}s"
+        line += f", {counter['mb_per_s']:.1f} MB/s)" if "mb_per_s" in counter else ")"
+        print(line, file=file)
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+class Progress:
+    """Live progress bar for counter `name`, drawn on stderr if it is a TTY.
+
+    `name` may also be a tuple of counters that are summed. Progress is measured in bytes,
+    or in events with unit="count". Only what is added after the bar starts counts
+    towards `total`.
+    """
+
+    def __init__(self, name, total, label, enabled=True, unit="bytes", interval=0.2, stream=sys.stderr):
+        self.names = (name,) if isinstance(name, str) else tuple(name)
+        self.total = total
+        self.label = label
+        self.unit = unit
+        self.enabled = enabled and total > 0 and stream.isatty()
+        self.interval = interval
+        self.stream = stream
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _done(self):
+        return sum(get(name)[self.unit] for name in self.names)
+
+    def _draw(self):
+        done = self._done() - self._base
+        elapsed = time.perf_counter() - self._start
+        rate = done / elapsed if elapsed else 0.0
+        fraction = min(done / self.total, 1.0)
+        if done >= self.total:
+            eta = format_seconds(0)
+        else:
+            eta = format_seconds((self.total - done) / rate) if rate else "--:--:--"
+        bar = "#" * int(fraction * 30)
+        speed = f"{rate / 1e6:7.1f} MB/s" if self.unit == "bytes" else f"{done}/{self.total} {rate:5.1f}/s"
+        self.stream.write(f"\r{self.label} [{bar:<30}] {fraction:6.1%} {speed} ETA {eta}")
+        self.stream.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def __enter__(self):
+        if self.enabled:
+            self._base = self._done()
+            self._start = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._draw()
+            self.stream.write("\n")
+            self.stream.flush()